@@ -21,8 +21,9 @@ app = Flask(__name__)
 CORS(app)
 login = LoginManager(app)
 
-# Get a cryptographically secure random sequence of bytes to be used as the app's secret_key
-app.secret_key = os.urandom(24)
+# Secret key signing session cookies, it must be shared by all worker processes so that OAuth callbacks can be served by any worker
+# It is generated by gunicorn.conf.py before workers are forked if it is not set, random bytes are used by single process servers
+app.secret_key = os.environ.get('API_SECRET_KEY') or os.urandom(24)
 
 # This is required to fix swagger UI not loading issue due to https
 @property
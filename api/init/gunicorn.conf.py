@@ -0,0 +1,24 @@
+"""Gunicorn configuration used to serve the API in production with several worker processes and threads."""
+import multiprocessing
+import os
+
+bind = '0.0.0.0:5434'
+workers = int(os.environ.get('API_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+os.environ.setdefault('API_SECRET_KEY', os.urandom(24).hex())  # Inherited by forked workers so that they sign session cookies with the same key
+worker_class = 'gthread'
+threads = int(os.environ.get('API_THREADS', 8))
+timeout = int(os.environ.get('API_TIMEOUT', 120))
+accesslog = '-'
+
+
+def post_worker_init(worker):
+    """Load keys and open the pooled GraphQL session once per worker, before the first request is served."""
+    from proxy.utils import get_session
+    from security.keys import get_private_key, get_public_key
+
+    get_session()
+    for get_key in [get_public_key, get_private_key]:
+        try:
+            get_key()
+        except OSError:
+            worker.log.warning('Key could not be loaded by worker %s, it will be loaded on first use.', worker.pid)
@@ -1,3 +1,4 @@
+import os
 import docker
 
 
@@ -12,6 +13,10 @@ class ExecuteBatch():
     def execute_batch(self, response: dict):
         """Method used to run Docker container which executes batch of indicators."""
 
+        # Batches are picked up by the scripts worker when it is enabled, otherwise run a container per batch
+        if os.environ.get('BATCH_EXECUTION_MODE', 'container') == 'worker':
+            return response
+
         batch_id = str(response['data']['executeBatch']['batch']['id'])
         container_name = f'mobydq-batch-{batch_id}'
         client = docker.from_env()
@@ -20,6 +25,7 @@ class ExecuteBatch():
             image='mobydq-scripts',
             network='mobydq-network',
             command=['python', 'run.py', 'execute_batch', batch_id],
+            environment={'DATABASE_URL': os.environ.get('DATABASE_URL')},
             remove=True,
             detach=True
         )
@@ -1,20 +1,28 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
 import docker
 from proxy import utils
 
+log = logging.getLogger(__name__)
 
-class TestDataSource():
-    """Class used to manage execution of custom mutation testDataSource."""
+# Bounded pool of threads running connectivity tests in background, shared by all requests of the API process
+# DATA_SOURCE_TEST_CONCURRENCY is the bound of each worker process serving the API, not of the whole API
+# Up to the number of workers times DATA_SOURCE_TEST_CONCURRENCY test containers can run at once, set API_WORKERS to lower it
+TEST_CONCURRENCY = max(1, int(os.environ.get('DATA_SOURCE_TEST_CONCURRENCY', 1)))
+TEST_EXECUTOR = ThreadPoolExecutor(max_workers=TEST_CONCURRENCY)
 
-    def build_payload(self, mutation_arguments: str):
-        """Method used to surcharge payload sent to GraphQL API."""
+# Ids of data sources being tested by the API process, used to avoid submitting several tests of the same data source at once
+# Tests submitted by other processes are detected by Docker which does not run two containers with the same name
+RUNNING_TESTS = set()
+RUNNING_TESTS_LOCK = threading.Lock()
 
-        mutation = f'mutation testDataSource{{testDataSource(input:{mutation_arguments}){{dataSource{{id,connectivityStatus}}}}}}'
-        return mutation
 
-    def test_data_source(self, response: dict):
-        """Method used to run Docker container which tests connectivity to a data source."""
+def run_data_source_test(data_source_id: str):
+    """Method used to run Docker container which tests connectivity to a data source and wait for its completion."""
 
-        data_source_id = str(response['data']['testDataSource']['dataSource']['id'])
+    try:
         container_name = f'mobydq-test-data-source-{data_source_id}'
         client = docker.from_env()
         client.containers.run(
@@ -22,11 +30,52 @@ class TestDataSource():
             image='mobydq-scripts',
             network='mobydq-network',
             command=['python', 'run.py', 'test_data_source', data_source_id],
-            stream=True,
             remove=True
         )
 
-        # Get connectivity test result
-        query = f'query{{dataSourceById(id:{data_source_id}){{id,connectivityStatus}}}}'
-        data = utils.execute_graphql_request(query)
-        return data
+    except docker.errors.APIError as exception:
+        if exception.status_code == 409:
+            # Container of the same name exists, the data source is being tested by another worker process
+            log.info('Connectivity test of data source Id %s is already running.', data_source_id)
+        else:
+            fail_data_source_test(data_source_id)
+
+    except Exception:  # pylint: disable=broad-except
+        fail_data_source_test(data_source_id)
+
+    finally:
+        with RUNNING_TESTS_LOCK:
+            RUNNING_TESTS.discard(data_source_id)
+
+
+def fail_data_source_test(data_source_id: str):
+    """Method used to set connectivity status of a data source to Failed when its test could not be run."""
+
+    # Connectivity status would remain Pending if the container could not complete the test
+    log.exception('Connectivity test of data source Id %s failed to run.', data_source_id)
+    mutation = f'mutation{{updateDataSourceById(input:{{id:{data_source_id},dataSourcePatch:{{connectivityStatus:"Failed"}}}}){{dataSource{{connectivityStatus}}}}}}'
+    utils.execute_graphql_request({'query': mutation})
+
+
+class TestDataSource():
+    """Class used to manage execution of custom mutation testDataSource."""
+
+    def build_payload(self, mutation_arguments: str):
+        """Method used to surcharge payload sent to GraphQL API."""
+
+        mutation = f'mutation testDataSource{{testDataSource(input:{mutation_arguments}){{dataSource{{id,connectivityStatus}}}}}}'
+        return mutation
+
+    def test_data_source(self, response: dict):
+        """Method used to submit the connectivity test of a data source to the background pool."""
+
+        data_source_id = str(response['data']['testDataSource']['dataSource']['id'])
+        with RUNNING_TESTS_LOCK:
+            if data_source_id in RUNNING_TESTS:
+                return response
+            RUNNING_TESTS.add(data_source_id)
+
+        TEST_EXECUTOR.submit(run_data_source_test, data_source_id)
+
+        # Return original response with Pending connectivity status, result can be polled with query dataSourceById
+        return response
@@ -15,6 +15,11 @@ class Interceptor():
             'testDataSource': {'module': 'proxy.data_source', 'class': 'TestDataSource', 'method': 'test_data_source'}
         }
 
+    def may_handle_mutation(self, payload: str):
+        """Method used to verify if a raw payload might contain a mutation handled by the interceptor, without parsing it."""
+
+        return 'mutation' in payload and any(mutation_name in payload for mutation_name in self.can_handle_mutations)
+
     def get_mutation_name(self, payload: Document):
         """Method used to verify if the interceptor can handle the mutation."""
 
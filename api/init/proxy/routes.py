@@ -3,7 +3,7 @@ from flask import request, jsonify, make_response
 from flask_restplus import Resource, fields, Namespace, Api
 from proxy.exceptions import RequestException
 from proxy.interceptor import Interceptor
-from proxy.utils import validate_graphql_request, execute_graphql_request
+from proxy.utils import validate_graphql_request, execute_graphql_request, stream_graphql_request
 from security.decorators import token_required
 
 # pylint: disable=unused-variable
@@ -33,18 +33,21 @@ def register_graphql(namespace: Namespace, api: Api):
             payload = request.json
 
             try:
-                # Validate http request payload and convert it to GraphQL document
-                graphql_document = validate_graphql_request(
-                    payload['query'])
-
-                # Verify GraphQL mutation can be handled
+                # Verify GraphQL mutation can be handled, payload is only converted to GraphQL document if it might be intercepted
                 interceptor = Interceptor()
-                mutation_name = interceptor.get_mutation_name(graphql_document)
+                mutation_name = None
+                if interceptor.may_handle_mutation(payload['query']):
+                    graphql_document = validate_graphql_request(
+                        payload['query'])
+                    mutation_name = interceptor.get_mutation_name(graphql_document)
+
+                # Stream response of GraphQL API back to the client when no script must be triggered
+                if not mutation_name:
+                    return stream_graphql_request(payload)
 
                 # Surcharge payload before request
-                if mutation_name:
-                    payload['query'] = interceptor.before_request(
-                        mutation_name)
+                payload['query'] = interceptor.before_request(
+                    mutation_name)
 
                 # Execute request on GraphQL API
                 status, data = execute_graphql_request(payload)
@@ -52,8 +55,7 @@ def register_graphql(namespace: Namespace, api: Api):
                     raise RequestException(status, data)
 
                 # Execute custom scripts after request
-                if mutation_name:
-                    data = interceptor.after_request(mutation_name, data)
+                data = interceptor.after_request(mutation_name, data)
 
                 return make_response(jsonify(data), status)
 
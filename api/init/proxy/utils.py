@@ -1,24 +1,78 @@
+from functools import lru_cache
+import os
+import threading
 import requests
+from flask import Response
 from graphql.parser import GraphQLParser
+from requests.adapters import HTTPAdapter
 from proxy.exceptions import RequestException
 
+# Maximum number of keep-alive connections to the GraphQL API, one per concurrent request thread
+SESSION_POOL_SIZE = int(os.environ.get('GRAPHQL_POOL_SIZE', 32))
+
 
 def validate_graphql_request(payload: str):
     """Method to parse http request payload verify it is a valid GraphQL query or mutation and return a GraphQL document."""
 
     try:
-        return GraphQLParser().parse(payload)
+        return parse_graphql_request(payload)
     except Exception:
         raise RequestException(400, 'Invalid GraphQL payload.')
 
 
+@lru_cache(maxsize=256)
+def parse_graphql_request(payload: str):
+    """Method to parse http request payload into a GraphQL document, documents of recent payloads are cached and must not be modified."""
+
+    return GraphQLParser().parse(payload)
+
+
+GRAPHQL_URL = os.environ.get('GRAPHQL_URL', 'http://graphql:5433/graphql')
+
+# Size of chunks streamed back to the client in pass-through mode
+STREAM_CHUNK_SIZE = 65536
+
+# Keep-alive session shared by the threads of the API process, recreated when the process is forked
+SESSION_LOCK = threading.Lock()
+SESSION = None
+SESSION_PROCESS_ID = None
+
+
+def get_session():
+    """Method to get the pooled http session used to send requests to the GraphQL API."""
+
+    global SESSION, SESSION_PROCESS_ID  # pylint: disable=global-statement
+    with SESSION_LOCK:
+        if SESSION is None or SESSION_PROCESS_ID != os.getpid():
+            SESSION = requests.Session()
+            SESSION.mount('http://', HTTPAdapter(pool_maxsize=SESSION_POOL_SIZE))
+            SESSION_PROCESS_ID = os.getpid()
+        return SESSION
+
+
 def execute_graphql_request(payload: dict):
     """Method to execute http request on the GraphQL API."""
 
-    url = 'http://graphql:5433/graphql'  # Should be moved to config file
     headers = {'Content-Type': 'application/json'}
-    response = requests.post(url, headers=headers, json=payload)
+    response = get_session().post(GRAPHQL_URL, headers=headers, json=payload)
     status = response.status_code
     data = response.json()
 
     return status, data
+
+
+def stream_graphql_request(payload: dict):
+    """Method to execute http request on the GraphQL API and return its raw response without decoding it."""
+
+    headers = {'Content-Type': 'application/json'}
+    response = get_session().post(GRAPHQL_URL, headers=headers, json=payload, stream=True)
+
+    def generate():
+        try:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                yield chunk
+        finally:
+            response.close()  # Release connection to the pool
+
+    content_type = response.headers.get('Content-Type', 'application/json')
+    return Response(generate(), status=response.status_code, content_type=content_type)
@@ -1,15 +1,34 @@
+import os
+import threading
 from jwt import jwk_from_pem
 
 
+# Keys loaded from the docker secrets files, reloaded only when files are modified
+KEYS = {}  # File path: (modification time, key)
+KEYS_LOCK = threading.Lock()
+
+
+def get_key(file_path: str):
+    """Gets a key from a PEM file, parsing the file only when it has been modified since it was last loaded."""
+
+    modification_time = os.stat(file_path).st_mtime
+    with KEYS_LOCK:
+        if file_path in KEYS and KEYS[file_path][0] == modification_time:
+            return KEYS[file_path][1]
+
+        with open(file_path, 'rb') as fh:
+            key = jwk_from_pem(fh.read())
+        KEYS[file_path] = (modification_time, key)
+        return key
+
+
 def get_public_key():
     """Gets the public key from the docker secrets file."""
 
-    with open('/run/secrets/public_key', 'rb') as fh:
-        return jwk_from_pem(fh.read())
+    return get_key(os.environ.get('PUBLIC_KEY_FILE', '/run/secrets/public_key'))
 
 
 def get_private_key():
     """Gets the private key from the docker secrets file."""
 
-    with open('/run/secrets/private_key', 'rb') as fh:
-        return jwk_from_pem(fh.read())
+    return get_key(os.environ.get('PRIVATE_KEY_FILE', '/run/secrets/private_key'))
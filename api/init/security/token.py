@@ -1,5 +1,8 @@
+import hashlib
 import time
 import os
+import threading
+from collections import OrderedDict
 from enum import Enum
 from jwt import JWT
 from jwt.exceptions import JWTDecodeError
@@ -9,6 +12,12 @@ from security.keys import get_private_key, get_public_key
 
 TOKEN_VALIDITY = 3600
 
+# Digests of tokens already verified with their expiration time, limited to the most recently used tokens
+VERIFIED_TOKENS_SIZE = 1024
+VERIFIED_TOKENS = OrderedDict()
+VERIFIED_TOKENS_LOCK = threading.Lock()
+VERIFIED_TOKENS_KEY = None  # Key used to verify cached tokens, cache is cleared when it changes
+
 
 class TokenType(Enum):
     """Defines all OAuth providers."""
@@ -18,15 +27,41 @@ class TokenType(Enum):
 
 
 def is_token_valid(token: str):
-    """Checks whether a given JWT is valid."""
+    """Checks whether a given JWT is valid. Tokens already verified are not verified again until they expire."""
 
+    global VERIFIED_TOKENS_KEY  # pylint: disable=global-statement
     verifying_key = get_public_key()
+    digest = hashlib.sha256(token.encode('utf-8')).digest()
+    now = time.time()
+
+    with VERIFIED_TOKENS_LOCK:
+        if verifying_key is not VERIFIED_TOKENS_KEY:
+            VERIFIED_TOKENS.clear()
+            VERIFIED_TOKENS_KEY = verifying_key
+
+        if digest in VERIFIED_TOKENS:
+            if VERIFIED_TOKENS[digest] > now:
+                VERIFIED_TOKENS.move_to_end(digest)
+                return True
+            del VERIFIED_TOKENS[digest]
+            return False
+
     try:
         parsed_token = JWT().decode(token, verifying_key)
-        return int(parsed_token['exp']) > time.time()
+        expiration_time = int(parsed_token['exp'])
     except JWTDecodeError:
         return False
 
+    if expiration_time <= now:
+        return False
+
+    with VERIFIED_TOKENS_LOCK:
+        if verifying_key is VERIFIED_TOKENS_KEY:
+            VERIFIED_TOKENS[digest] = expiration_time
+            if len(VERIFIED_TOKENS) > VERIFIED_TOKENS_SIZE:
+                VERIFIED_TOKENS.popitem(last=False)
+    return True
+
 
 def get_jwt_token(token_type: TokenType, email: str, user_info: object, oauth_token: object):
     """Gets a signed JWT token for the specified OAuth provider."""
@@ -40,6 +40,33 @@ base.delete_children('session', 'indicator_id');
 
 
 
+/*Create table indicator state*/
+CREATE TABLE base.indicator_state (
+    id SERIAL PRIMARY KEY
+  , watermark JSONB
+  , nb_records INTEGER NOT NULL
+  , nb_records_alert INTEGER NOT NULL
+  , data JSONB
+  , state_hash TEXT NOT NULL
+  , created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  , updated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  , user_group_id INTEGER DEFAULT 0 REFERENCES base.user_group(id)
+  , indicator_id INTEGER NOT NULL UNIQUE REFERENCES base.indicator(id)
+);
+
+COMMENT ON TABLE base.indicator_state IS
+'Indicator states contain the watermark and results of the last successful session of incremental indicators.';
+
+CREATE TRIGGER indicator_state_update_updated_date BEFORE UPDATE
+ON base.indicator_state FOR EACH ROW EXECUTE PROCEDURE
+base.update_updated_date();
+
+CREATE TRIGGER indicator_delete_indicator_state BEFORE DELETE
+ON base.indicator FOR EACH ROW EXECUTE PROCEDURE
+base.delete_children('indicator_state', 'indicator_id');
+
+
+
 /*Create function to duplicate an indicator*/
 CREATE OR REPLACE FUNCTION base.duplicate_indicator(indicator_id INTEGER, new_indicator_name TEXT)
 RETURNS base.indicator AS $$
@@ -41,4 +41,5 @@ INSERT INTO base.parameter_type (name, description) VALUES
 , ('Source', 'Name of the data source which serves as a reference to evaluate the quality of the data.')
 , ('Source request', 'SQL query used to compute the indicator on the source system.')
 , ('Target', 'Name of the data source on which to evaluate the quality of the data.')
-, ('Target request', 'SQL query used to compute the indicator on the target system.');
+, ('Target request', 'SQL query used to compute the indicator on the target system.')
+, ('Watermark', 'Name of a column of the target request which increases with new records, such as a timestamp or an id. It must be one of the dimensions or measures and match the column name returned by the target request. When set, freshness and validity indicators only evaluate records above the highest value of the last successful session.');
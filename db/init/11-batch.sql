@@ -67,7 +67,8 @@ BEGIN
         ) INSERT INTO base.session (status, indicator_id, batch_id, user_group_id)
         SELECT 'Pending', indicator.id, batch.id, 0 FROM indicator;
     END IF;
-    -- Executions of indicators are triggered by the Flask API
+    -- Executions of indicators are triggered by the Flask API or by the scripts worker listening to this notification
+    PERFORM pg_notify('batch_pending', batch.id::TEXT);
     -- Return batch record
     RETURN batch;
 END;
@@ -19,3 +19,25 @@ CREATE TABLE base.session_result (
 
 COMMENT ON TABLE base.session_result IS
 'Session results contain a summary of indicators execution.';
+
+
+
+/*Create table session result detail*/
+CREATE TABLE base.session_result_detail (
+    id BIGSERIAL PRIMARY KEY
+  , alert BOOLEAN NOT NULL
+  , record JSONB NOT NULL
+  , created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  , user_group_id INTEGER DEFAULT 0 REFERENCES base.user_group(id)
+  , session_id INTEGER NOT NULL REFERENCES base.session(id)
+);
+
+COMMENT ON TABLE base.session_result_detail IS
+'Session result details contain the records computed by indicators execution.';
+
+CREATE INDEX session_result_detail_session_id_alert_id
+ON base.session_result_detail (session_id, alert, id);
+
+CREATE TRIGGER session_delete_session_result_detail BEFORE DELETE
+ON base.session FOR EACH ROW EXECUTE PROCEDURE
+base.delete_children('session_result_detail', 'session_id');
@@ -94,3 +94,19 @@ ALTER TABLE base.session_result ENABLE ROW LEVEL SECURITY;
 
 CREATE POLICY user_group_session_result on base.session_result
 TO standard USING (pg_has_role('user_group_' || user_group_id, 'MEMBER'));
+
+
+
+/*Create row level security for session result detail*/
+ALTER TABLE base.session_result_detail ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY user_group_session_result_detail on base.session_result_detail
+TO standard USING (pg_has_role('user_group_' || user_group_id, 'MEMBER'));
+
+
+
+/*Create row level security for indicator state*/
+ALTER TABLE base.indicator_state ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY user_group_indicator_state on base.indicator_state
+TO standard USING (pg_has_role('user_group_' || user_group_id, 'MEMBER'));
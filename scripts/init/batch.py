@@ -1,14 +1,20 @@
 """Manage class and methods for batches."""
 import logging
 import sys
+import time
 import traceback
 from ast import literal_eval
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import groupby
+from typing import Callable, Iterable, List
 import completeness  # Called dynamically with getattr pylint: disable=W0611
 import freshness  # Called dynamically with getattr pylint: disable=W0611
 import latency  # Called dynamically with getattr pylint: disable=W0611
 import validity  # Called dynamically with getattr pylint: disable=W0611
 import utils
-from session import update_session_status
+from data_source import clear_data_sources, close_connection_pool, open_connection_pool, prefetch_data_sources
+from indicator import close_result_cache, open_result_cache
+from session import delete_session_result_detail, update_session_status
 
 # Load logging configuration
 log = logging.getLogger(__name__)
@@ -22,22 +28,45 @@ class Batch:
 
     def update_batch_status(self, batch_id: int, batch_status: str):
         """Update a batch status."""
-        mutation = 'mutation{updateBatchById(input:{id:batch_id,batchPatch:{status:"batch_status"}}){batch{status}}}'
-        mutation = mutation.replace('batch_id', str(batch_id))  # Use replace() instead of format() because of curly braces
-        mutation = mutation.replace('batch_status', str(batch_status))  # Use replace() instead of format() because of curly braces
-        data = utils.execute_graphql_request(mutation)
+        mutation = 'mutation updateBatchStatus($id:Int!,$status:String!){updateBatchById(input:{id:$id,batchPatch:{status:$status}}){batch{status}}}'
+        variables = {'id': batch_id, 'status': batch_status}
+        data = utils.execute_graphql_request(mutation, variables)
         return data
 
+    def log_graphql_statistics(self, batch_id: int, initial_statistics: dict):
+        """Log the number and latency of GraphQL requests executed by the current process since initial statistics."""
+        statistics = utils.get_graphql_client().get_statistics()
+        request_count = statistics['request_count'] - initial_statistics['request_count']
+        request_time = statistics['request_time'] - initial_statistics['request_time']
+        log.info('Batch Id %i executed %i GraphQL request(s) in %.3f seconds.', batch_id, request_count, request_time)
+
+    def close_resources(self, batch_id: int):
+        """Release data sources, notifications, result cache and connections opened for a batch and log their statistics."""
+        clear_data_sources()
+        mail_statistics = utils.close_mail_session()
+        if mail_statistics:
+            log.info('Batch Id %i notification statistics: %i sent, %i failed, %i retried, %i pending.', batch_id,
+                     mail_statistics['sent'], mail_statistics['failed'], mail_statistics['retries'], mail_statistics['pending'])
+        result_cache_statistics = close_result_cache()
+        if result_cache_statistics:
+            log.info('Batch Id %i result cache statistics: %i hit(s), %i miss(es), %i eviction(s).', batch_id,
+                     result_cache_statistics['hits'], result_cache_statistics['misses'], result_cache_statistics['evictions'])
+        connection_pool_statistics = close_connection_pool()
+        if connection_pool_statistics:
+            log.info('Batch Id %i connection pool statistics: %i hit(s), %i miss(es), %i eviction(s).', batch_id,
+                     connection_pool_statistics['hits'], connection_pool_statistics['misses'], connection_pool_statistics['evictions'])
+
     def execute(self, batch_id: int):
         log.info('Start execution of batch Id %i.', batch_id)
+        graphql_statistics = utils.get_graphql_client().get_statistics()
 
         # Get list of indicator sessions
         log.debug('Get list of indicator sessions.')
-        query = '''query{allSessions(condition:{batchId:batch_id},orderBy:ID_ASC){
-        nodes{id,batchId,indicatorId,indicatorByIndicatorId{name,indicatorTypeId,indicatorTypeByIndicatorTypeId{module,class,method},parametersByIndicatorId{
+        query = '''query getSessions($batchId:Int!){allSessions(condition:{batchId:$batchId},orderBy:ID_ASC){
+        nodes{id,batchId,indicatorId,indicatorByIndicatorId{name,executionOrder,indicatorTypeId,indicatorTypeByIndicatorTypeId{module,class,method},parametersByIndicatorId{
         nodes{parameterTypeId,value}}}}}}'''
-        query = query.replace('batch_id', str(batch_id))  # Use replace() instead of format() because of curly braces
-        response = utils.execute_graphql_request(query)
+        variables = {'batchId': batch_id}
+        response = utils.execute_graphql_request(query, variables)
 
         if response['data']['allSessions']['nodes']:
             # Update batch status to running
@@ -45,31 +74,44 @@ class Batch:
             self.update_batch_status(batch_id, 'Running')
             is_error = False  # Variable used to update batch status to Failed if one indicator fails
 
-            # For each indicator session execute corresponding method
-            for session in response['data']['allSessions']['nodes']:
-                try:
-                    module_name = session['indicatorByIndicatorId']['indicatorTypeByIndicatorTypeId']['module']
-                    class_name = session['indicatorByIndicatorId']['indicatorTypeByIndicatorTypeId']['class']
-                    method_name = session['indicatorByIndicatorId']['indicatorTypeByIndicatorTypeId']['method']
-                    class_instance = getattr(sys.modules[module_name], class_name)()
-                    getattr(class_instance, method_name)(session)
-
-                except Exception: # pylint: disable=broad-except
-                    is_error = True
-                    error_message = traceback.format_exc()
-                    log.error(error_message)
-
-                    # Update session status
-                    session_id = session['id']
-                    update_session_status(session_id, 'Failed')
-
-                    # Get error context and send error e-mail
-                    indicator_id = session['indicatorId']
-                    indicator_name = session['indicatorByIndicatorId']['name']
-                    for parameter in session['indicatorByIndicatorId']['parametersByIndicatorId']['nodes']:
-                        if parameter['parameterTypeId'] == 3:  # Distribution list
-                            distribution_list = literal_eval(parameter['value'])
-                            utils.send_error(indicator_id, indicator_name, session_id, distribution_list, error_message)
+            sessions = response['data']['allSessions']['nodes']
+            start_time = time.perf_counter()
+            session_time = 0
+            try:
+                # Get definitions and passwords of all data sources used in the batch
+                prefetch_data_sources(get_data_source_names(sessions))
+                open_connection_pool()
+                open_result_cache()
+                utils.open_mail_session()
+
+                # Get concurrency configuration
+                concurrency = int(utils.get_parameter('batch', 'concurrency'))
+                executor_type = utils.get_parameter('batch', 'executor')
+                log.debug('Execute sessions with concurrency %i using %s executor.', concurrency, executor_type)
+
+                # Group sessions per execution order, each group must complete before the next one starts
+                sessions = sorted(sessions, key=get_execution_order)
+                with get_executor(concurrency, executor_type) as executor:
+                    for execution_order, execution_group in groupby(sessions, key=get_execution_order):
+                        execution_group = list(execution_group)
+                        log.debug('Execute %i session(s) with execution order %s.', len(execution_group), execution_order)
+                        for session_error, session_wall_time in executor.map(execute_session, execution_group):
+                            is_error = is_error or session_error
+                            session_time += session_wall_time
+            except Exception:
+                # Do not leave the batch running if it could not be executed until its end
+                log.exception('Execution of batch Id %i failed.', batch_id)
+                log.debug('Update batch status to Failed.')
+                self.update_batch_status(batch_id, 'Failed')
+                raise
+            finally:
+                # Do not keep data source credentials and connections beyond the lifetime of the batch
+                self.close_resources(batch_id)
+
+            batch_time = time.perf_counter() - start_time
+            log.info('Batch Id %i executed %i session(s) in %.3f seconds, sum of session wall times is %.3f seconds.',
+                     batch_id, len(sessions), batch_time, session_time)
+            self.log_graphql_statistics(batch_id, graphql_statistics)
 
             # Update batch status
             if is_error:
@@ -85,3 +127,92 @@ class Batch:
             error_message = f'Batch Id {batch_id} does not exist or has no indicator session.'
             log.error(error_message)
             raise Exception(error_message)
+
+
+def get_data_source_names(sessions: List[dict]):
+    """Return the names of the source and target data sources used by a list of sessions."""
+    data_source_names = set()
+    for session in sessions:
+        for parameter in session['indicatorByIndicatorId']['parametersByIndicatorId']['nodes']:
+            if parameter['parameterTypeId'] in [6, 8]:  # Source, Target
+                data_source_names.add(parameter['value'])
+    return data_source_names
+
+
+def get_execution_order(session: dict):
+    """Return the execution order of the indicator of a session, indicators without execution order are executed last as in base.execute_batch."""
+    execution_order = session['indicatorByIndicatorId']['executionOrder']
+    return execution_order if execution_order is not None else float('inf')
+
+
+def get_executor(concurrency: int, executor_type: str):
+    """Return the pool used to execute the sessions of a batch."""
+    if concurrency <= 1:
+        return SequentialExecutor()
+    if executor_type == 'thread':
+        return ThreadPoolExecutor(max_workers=concurrency)
+    if executor_type == 'process':
+        return ProcessPoolExecutor(max_workers=concurrency)
+
+    error_message = f'Invalid batch executor {executor_type}.'
+    log.error(error_message)
+    raise ValueError(error_message)
+
+
+class SequentialExecutor:
+    """Executor running sessions one after another in the current thread."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def map(self, function: Callable, iterable: Iterable):
+        """Apply function to each item of iterable."""
+        return map(function, iterable)
+
+
+def execute_session(session: dict):
+    """Execute an indicator session. Return True if the session failed and its wall time in seconds."""
+    session_id = session['id']
+    is_error = False
+    start_time = time.perf_counter()
+    mutation_buffer = utils.MutationBuffer()
+    try:
+        module_name = session['indicatorByIndicatorId']['indicatorTypeByIndicatorTypeId']['module']
+        class_name = session['indicatorByIndicatorId']['indicatorTypeByIndicatorTypeId']['class']
+        method_name = session['indicatorByIndicatorId']['indicatorTypeByIndicatorTypeId']['method']
+        class_instance = getattr(sys.modules[module_name], class_name)()
+        getattr(class_instance, method_name)(session, mutation_buffer)
+
+    except Exception:  # pylint: disable=broad-except
+        is_error = True
+        error_message = traceback.format_exc()
+        log.error(error_message)
+
+        # Update session status along with session results which have not been sent yet
+        update_session_status(session_id, 'Failed', mutation_buffer)
+        try:
+            mutation_buffer.flush()
+        except Exception:  # pylint: disable=broad-except
+            # Session is counted as failed even if its status could not be updated, other sessions must be executed
+            log.exception('Status of session Id %i could not be updated to Failed.', session_id)
+
+        # Do not keep the records of a failed session, they could be partial
+        try:
+            delete_session_result_detail(session_id)
+        except Exception:  # pylint: disable=broad-except
+            log.exception('Result details of session Id %i could not be deleted.', session_id)
+
+        # Get error context and send error e-mail
+        indicator_id = session['indicatorId']
+        indicator_name = session['indicatorByIndicatorId']['name']
+        for parameter in session['indicatorByIndicatorId']['parametersByIndicatorId']['nodes']:
+            if parameter['parameterTypeId'] == 3:  # Distribution list
+                distribution_list = literal_eval(parameter['value'])
+                utils.send_error(indicator_id, indicator_name, session_id, distribution_list, error_message)
+
+    wall_time = time.perf_counter() - start_time
+    log.info('Session Id %i executed in %.3f seconds.', session_id, wall_time)
+    return is_error, wall_time
@@ -1,18 +1,36 @@
 """Manage class and methods for data completeness indicators."""
 import logging
+import tempfile
 import pandas
-from indicator import Indicator
+from constants import DataSourceType
+from data_source import connect, get_data_source, read_sql
+from indicator import DEFAULT_SPILL_CHUNK_SIZE, Indicator
 from session import update_session_status
+from utils import MutationBuffer
+import utils
 
 # Load logging configuration
 log = logging.getLogger(__name__)
 
+# Data source types supporting full outer joins on subqueries with derived column lists
+PUSHDOWN_DATA_SOURCE_TYPES = [DataSourceType.MSSQL_ID, DataSourceType.POSTGRESQL_ID, DataSourceType.TERADATA_ID]
+
+# Unbounded text types used to compare dimensions in join conditions which PostgreSQL can execute as hash or merge joins
+# Dimensions are compared with their native types on data source types without unbounded text type which can be compared
+JOIN_TEXT_TYPES = {DataSourceType.MSSQL_ID: 'NVARCHAR(MAX)', DataSourceType.POSTGRESQL_ID: 'TEXT'}
+
+# SQL equivalents of alert operators
+SQL_ALERT_OPERATORS = {'==': '=', '>': '>', '>=': '>=', '<': '<', '<=': '<=', '!=': '<>'}
+
 
 class Completeness(Indicator):
     """Class used to compute indicators of type completeness."""
 
-    def execute(self, session: dict):
+    def execute(self, session: dict, mutation_buffer: MutationBuffer = None):
         """Execute indicator of type completeness."""
+        if mutation_buffer is None:
+            mutation_buffer = MutationBuffer()
+
         # Update session status to running
         session_id = session['id']
         indicator_id = session['indicatorId']
@@ -23,41 +41,74 @@ class Completeness(Indicator):
         # Verify if the list of indicator parameters is valid
         indicator_type_id = session['indicatorByIndicatorId']['indicatorTypeId']
         parameters = session['indicatorByIndicatorId']['parametersByIndicatorId']['nodes']
-        parameters = super().verify_indicator_parameters(indicator_type_id, parameters)
-
-        # Get source data
-        dimensions = parameters[4]
-        measures = parameters[5]
-        source = parameters[6]
-        source_request = parameters[7]
-        source_data = super().get_data_frame(source, source_request, dimensions, measures)
-
-        # Get target data
-        target = parameters[8]
-        target_request = parameters[9]
-        target_data = super().get_data_frame(target, target_request, dimensions, measures)
-
-        # Evaluate completeness
-        alert_operator = parameters[1]  # Alert operator
-        alert_threshold = parameters[2]  # Alert threshold
-        log.info('Evaluate completeness of target data source.')
-        result_data = self.evaluate_completeness(
-            source_data, target_data, dimensions, measures, alert_operator, alert_threshold)
-
-        # Compute session result
-        nb_records_alert = super().compute_session_result(
-            session_id, alert_operator, alert_threshold, result_data)
+        config = super().get_indicator_config(indicator_type_id, parameters)
+
+        # Get source and target data concurrently and evaluate completeness
+        dimensions = config.dimensions
+        measures = config.measures
+        source = config.source
+        source_request = config.source_request
+        target = config.target
+        target_request = config.target_request
+        alert_operator = config.alert_operator
+        alert_threshold = config.alert_threshold
+        spill_partitions = int(utils.get_parameter('indicator', 'spill_partitions'))
+        pushdown = int(utils.get_parameter('indicator', 'pushdown'))
+
+        result_data = None
+        if pushdown and source == target:
+            # Compare source and target data on the data source itself when possible
+            result_data = self.evaluate_completeness_pushdown(
+                source, source_request, target_request, dimensions, measures, alert_operator, alert_threshold)
+
+        if result_data is not None:
+            # Compute session result
+            nb_records_alert = super().compute_session_result(
+                session_id, alert_operator, alert_threshold, result_data, mutation_buffer)
+
+        elif spill_partitions > 0:
+            # Spill source and target data to partition files on disk and compare them partition by partition
+            chunk_size = int(utils.get_parameter('indicator', 'chunk_size')) or DEFAULT_SPILL_CHUNK_SIZE
+            with tempfile.TemporaryDirectory() as directory:
+                super().spill_data_frames(
+                    directory, spill_partitions, chunk_size,
+                    (source, source_request, dimensions, measures),
+                    (target, target_request, dimensions, measures))
+
+                log.info('Evaluate completeness of target data source by partitions.')
+                partitions = super().read_partitions(directory, spill_partitions)
+                nb_records, nb_records_alert, result_data = super().evaluate_data_frame_chunks(
+                    partitions, lambda partition: self.evaluate_completeness(*partition, dimensions, measures, alert_operator, alert_threshold), session_id)
+            result_data = result_data.sort_values(dimensions).reset_index(drop=True)
+
+            # Compute session result
+            super().create_session_result(
+                session_id, alert_operator, alert_threshold, nb_records, nb_records_alert, mutation_buffer)
+
+        else:
+            source_data, target_data = super().get_data_frames(
+                (source, source_request, dimensions, measures),
+                (target, target_request, dimensions, measures))
+
+            log.info('Evaluate completeness of target data source.')
+            result_data = self.evaluate_completeness(
+                source_data, target_data, dimensions, measures, alert_operator, alert_threshold)
+
+            # Compute session result
+            nb_records_alert = super().compute_session_result(
+                session_id, alert_operator, alert_threshold, result_data, mutation_buffer)
 
         # Send e-mail alert
         if nb_records_alert != 0:
             indicator_name = session['indicatorByIndicatorId']['name']
-            distribution_list = parameters[3]  # Distribution list
+            distribution_list = config.distribution_list
             super().send_alert(indicator_id, indicator_name, session_id, distribution_list,
                                alert_operator, alert_threshold, nb_records_alert, result_data)
 
-        # Update session status to succeeded
+        # Update session status to succeeded along with session results
         log.debug('Update session status to Succeeded.')
-        update_session_status(session_id, 'Succeeded')
+        update_session_status(session_id, 'Succeeded', mutation_buffer)
+        mutation_buffer.flush()
         log.info('Session Id %i for indicator Id %i completed successfully.', session_id, indicator_id)
 
     def evaluate_completeness(self,
@@ -77,7 +128,8 @@ class Completeness(Indicator):
             how='outer',
             sort=True,
             suffixes=('_source', '_target'))
-        result_data = result_data.fillna(value=0)  # Replace NaN values per 0
+        measure_columns = [measure + suffix for measure in measures for suffix in ['_source', '_target']]
+        result_data = result_data.fillna(value={column: 0 for column in measure_columns})  # Replace NaN values per 0
 
         # Compute delta and delta percentage between source and target measures
         for measure in measures:
@@ -86,6 +138,10 @@ class Completeness(Indicator):
             delta_column = measure + '_delta'
             delta_percentage_column = measure + '_delta_percentage'
 
+            # Enforce measures to float so that downcast measures do not overflow
+            result_data[source_column] = result_data[source_column].astype(float)
+            result_data[target_column] = result_data[target_column].astype(float)
+
             # Compute delta
             delta = result_data[target_column] - result_data[source_column]
             result_data[delta_column] = delta
@@ -110,15 +166,125 @@ class Completeness(Indicator):
             result_data[delta_percentage_column] = round(
                 result_data[delta_percentage_column], 6).astype(float)
 
-        # For each record and measure in data frame test if alert must be sent and update alert column
-        result_data['Alert'] = False
+        # Test if alert must be sent for each record, multiply by 100 to format delta percentage to percentage
+        delta_percentage_columns = [measure + '_delta_percentage' for measure in measures]
+        measure_data = result_data[delta_percentage_columns].abs() * 100
+        result_data['Alert'] = super().evaluate_alert(measure_data, alert_operator, alert_threshold)
+
+        return result_data
+
+    def evaluate_completeness_pushdown(self,
+                                       data_source: str,
+                                       source_request: str,
+                                       target_request: str,
+                                       dimensions: str,
+                                       measures: str,
+                                       alert_operator: str,
+                                       alert_threshold: str):
+        """
+        Compute completeness indicator with a single request executed on the data source shared by source and target.
+        Return results in a data frame, or None if the data source type does not support it or if the request fails.
+        """
+        data_source_definition = get_data_source(data_source)
+        request = self.get_completeness_request(
+            data_source_definition['dataSourceTypeId'], source_request, target_request, len(dimensions), len(measures), alert_operator, alert_threshold)
+        if request is None:
+            log.info('Data source %s does not support completeness pushdown, compare data in memory.', data_source)
+            return None
+
+        log.info('Evaluate completeness of target data source on data source %s.', data_source)
+        try:
+            with connect(data_source_definition) as connection:
+                result_data = read_sql(connection, request)
+        except Exception:  # pylint: disable=broad-except
+            log.warning('Completeness pushdown failed on data source %s, compare data in memory.', data_source, exc_info=True)
+            log.debug('Request: %s.', request)
+            return None
+
+        if result_data.empty:
+            error_message = f'Request on data source {data_source} returned no data.'
+            log.error(error_message)
+            log.debug('Request: %s.', request)
+            raise Exception(error_message)
+
+        # Name columns the same way as in memory comparison
+        column_names = list(dimensions)
         for measure in measures:
-            for row_num in result_data.index:
-                measure_value = result_data.loc[row_num,
-                                                measure + '_delta_percentage']
-                # Multiply by 100 to format to percentage
-                measure_value = abs(measure_value) * 100
-                if super().is_alert(measure_value, alert_operator, alert_threshold):
-                    result_data.loc[row_num, 'Alert'] = True
+            column_names.extend([measure + '_source', measure + '_target', measure + '_delta', measure + '_delta_percentage'])
+        column_names.append('Alert')
+        result_data.columns = column_names
+
+        for column in dimensions:
+            result_data[column] = result_data[column].astype(str)  # Convert dimension values to string
+        result_data['Alert'] = result_data['Alert'] == 1
 
         return result_data
+
+    def get_completeness_request(self,
+                                 data_source_type_id: int,
+                                 source_request: str,
+                                 target_request: str,
+                                 nb_dimensions: int,
+                                 nb_measures: int,
+                                 alert_operator: str,
+                                 alert_threshold: str):
+        """
+        Build the request joining source and target requests, computing deltas, delta percentages and alert flag.
+        Return None if the data source type does not support it.
+        """
+        if data_source_type_id not in PUSHDOWN_DATA_SOURCE_TYPES:
+            return None
+
+        super().get_alert_function(alert_operator)  # Raise an error if alert operator is not supported
+        sql_operator = SQL_ALERT_OPERATORS[alert_operator]
+        threshold = repr(float(alert_threshold))
+
+        # Column aliases used in place of dimension and measure names
+        dimension_columns = [f'd{index}' for index in range(nb_dimensions)]
+        measure_columns = [f'm{index}' for index in range(nb_measures)]
+        columns = ', '.join(dimension_columns + measure_columns)
+
+        # Join source and target data on dimensions, null dimensions are matched as they are in memory
+        # Conditions only use equalities when possible so that PostgreSQL can execute the full outer join as a hash or merge join
+        # Dimensions are cast to unbounded text types only, long values would be truncated and distinct values matched otherwise
+        joined_columns = [f'COALESCE(source_data.{column}, target_data.{column}) AS {column}' for column in dimension_columns]
+        join_conditions = []
+        text_type = JOIN_TEXT_TYPES.get(data_source_type_id)
+        for column in dimension_columns:
+            if text_type:
+                join_conditions.append(
+                    f"COALESCE(CAST(source_data.{column} AS {text_type}), '') = COALESCE(CAST(target_data.{column} AS {text_type}), '')")
+                join_conditions.append(
+                    f'CASE WHEN source_data.{column} IS NULL THEN 1 ELSE 0 END = CASE WHEN target_data.{column} IS NULL THEN 1 ELSE 0 END')
+            else:
+                join_conditions.append(
+                    f'(source_data.{column} = target_data.{column} OR (source_data.{column} IS NULL AND target_data.{column} IS NULL))')
+
+        # Measures are cast to decimal since ROUND is not defined for floats on all data source types
+        for column in measure_columns:
+            joined_columns.append(f'COALESCE(CAST(source_data.{column} AS DECIMAL(38, 10)), 0) AS {column}_source')
+            joined_columns.append(f'COALESCE(CAST(target_data.{column} AS DECIMAL(38, 10)), 0) AS {column}_target')
+
+        # Compute delta and delta percentage, delta percentage is 0 when delta is 0 and 1 when source is 0
+        result_columns = list(dimension_columns)
+        alert_conditions = []
+        for column in measure_columns:
+            delta = f'{column}_target - {column}_source'
+            result_columns.append(f'ROUND({column}_source, 2) AS {column}_source')
+            result_columns.append(f'ROUND({column}_target, 2) AS {column}_target')
+            result_columns.append(f'ROUND({delta}, 2) AS {column}_delta')
+            result_columns.append(
+                f'ROUND(CASE WHEN {delta} = 0 THEN 0 WHEN {column}_source = 0 THEN 1 ELSE ({delta}) / {column}_source END, 6) AS {column}_delta_percentage')
+            alert_conditions.append(f'ABS({column}_delta_percentage) * 100 {sql_operator} {threshold}')
+
+        request = 'SELECT ' + ', '.join(dimension_columns + [f'{column}_{suffix}' for column in measure_columns for suffix in ['source', 'target', 'delta', 'delta_percentage']])
+        request += ', CASE WHEN ' + ' OR '.join(alert_conditions) + ' THEN 1 ELSE 0 END AS alert'
+        request += ' FROM (SELECT ' + ', '.join(result_columns)
+        request += ' FROM (SELECT ' + ', '.join(joined_columns)
+        request += f' FROM ({self.strip_request(source_request)}) AS source_data ({columns})'
+        request += f' FULL OUTER JOIN ({self.strip_request(target_request)}) AS target_data ({columns})'
+        request += ' ON ' + ' AND '.join(join_conditions)
+        request += ') joined_data) result_data'
+        request += ' ORDER BY ' + ', '.join(dimension_columns)
+
+        return request
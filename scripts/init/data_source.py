@@ -1,7 +1,15 @@
 """Manage class and methods for data sources."""
+from contextlib import contextmanager
+from typing import Iterable, List
 import logging
+import math
+import os
+import queue
 import sqlite3
+import threading
+import time
 import traceback
+import pandas
 import pyodbc
 import utils
 from constants import DataSourceType
@@ -9,12 +17,349 @@ from constants import DataSourceType
 # Load logging configuration
 log = logging.getLogger(__name__)
 
+# In-memory cache of data source definitions and passwords, populated for the lifetime of a batch and never written to disk
+DATA_SOURCE_CACHE = {}
+DATA_SOURCE_CACHE_LOCK = threading.Lock()
+
+
+def prefetch_data_sources(data_source_names: Iterable[str]):
+    """
+    Get definitions and passwords of the data sources used by a batch and cache them. Each data source is looked up with an aliased field,
+    so that definitions are fetched in a single request and only the passwords of these data sources are decrypted in a second request.
+    """
+    data_source_names = sorted(set(data_source_names))
+    if not data_source_names:
+        return
+
+    # Get data source definitions
+    log.debug('Get definitions and passwords of %i data source(s).', len(data_source_names))
+    variable_definitions = ','.join(f'$name{index}:String!' for index in range(len(data_source_names)))
+    fields = ','.join(f'dataSource{index}:dataSourceByName(name:$name{index}){{id,name,connectionString,login,dataSourceTypeId}}'
+                      for index in range(len(data_source_names)))
+    query = f'query getDataSources({variable_definitions}){{{fields}}}'
+    variables = {f'name{index}': name for index, name in enumerate(data_source_names)}
+    response = utils.execute_graphql_request(query, variables)
+    data_sources = [response['data'][f'dataSource{index}'] for index in range(len(data_source_names))]
+    data_sources = [data_source for data_source in data_sources if data_source]  # Missing data sources fail in get_data_source
+    if not data_sources:
+        return
+
+    # Get data source passwords
+    variable_definitions = ','.join(f'$id{index}:Int!' for index in range(len(data_sources)))
+    fields = ','.join(f'password{index}:allDataSourcePasswords(condition:{{id:$id{index}}}){{nodes{{password}}}}'
+                      for index in range(len(data_sources)))
+    query = f'query getDataSourcePasswords({variable_definitions}){{{fields}}}'
+    variables = {f'id{index}': data_source['id'] for index, data_source in enumerate(data_sources)}
+    response = utils.execute_graphql_request(query, variables)
+
+    with DATA_SOURCE_CACHE_LOCK:
+        for index, data_source in enumerate(data_sources):
+            nodes = response['data'][f'password{index}']['nodes']
+            data_source['password'] = nodes[0]['password'] if nodes else None
+            DATA_SOURCE_CACHE[data_source['name']] = data_source
+
+
+def clear_data_sources():
+    """Remove all data source definitions and passwords from the cache."""
+    with DATA_SOURCE_CACHE_LOCK:
+        DATA_SOURCE_CACHE.clear()
+
+
+def get_data_source(data_source_name: str):
+    """Return definition and password of a data source, from the cache when it has been prefetched."""
+    with DATA_SOURCE_CACHE_LOCK:
+        if data_source_name in DATA_SOURCE_CACHE:
+            return DATA_SOURCE_CACHE[data_source_name]
+
+    # Get data source definition
+    query = 'query getDataSource($name:String!){dataSourceByName(name:$name){id,name,connectionString,login,dataSourceTypeId}}'
+    variables = {'name': data_source_name}
+    response = utils.execute_graphql_request(query, variables)
+
+    if not response['data']['dataSourceByName']:
+        error_message = f'Data source {data_source_name} does not exist.'
+        log.error(error_message)
+        raise Exception(error_message)
+
+    # Get data source password
+    data_source = response['data']['dataSourceByName']
+    query = 'query getDataSourcePassword($id:Int!){allDataSourcePasswords(condition:{id:$id}){nodes{password}}}'
+    variables = {'id': data_source['id']}
+    response = utils.execute_graphql_request(query, variables)
+    data_source['password'] = response['data']['allDataSourcePasswords']['nodes'][0]['password']
+
+    return data_source
+
+
+class ConnectionPool:
+    """Pool of data source connections shared across the sessions of a batch, keyed by data source Id."""
+
+    def __init__(self, max_size: int, idle_timeout: float):
+        self.process_id = os.getpid()  # Connections cannot be shared with child processes
+        self.max_size = max_size  # Maximum number of connections per data source
+        self.idle_timeout = idle_timeout  # Seconds after which an idle connection is closed
+        self.lock = threading.Lock()
+        self.idle_connections = {}  # Data source Id: list of (connection, data source type Id, release time)
+        self.semaphores = {}  # Data source Id: semaphore limiting the number of connections
+        self.statistics = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get_semaphore(self, data_source_id: int):
+        """Return the semaphore limiting the number of connections to a data source."""
+        with self.lock:
+            if data_source_id not in self.semaphores:
+                self.semaphores[data_source_id] = threading.BoundedSemaphore(self.max_size)
+            return self.semaphores[data_source_id]
+
+    def evict_idle_connections(self):
+        """Close connections which have been idle for longer than the idle timeout. Must be called with the lock acquired."""
+        now = time.monotonic()
+        for data_source_id, idle_connections in self.idle_connections.items():
+            for idle_connection in list(idle_connections):
+                connection, _, release_time = idle_connection
+                if now - release_time > self.idle_timeout:
+                    idle_connections.remove(idle_connection)
+                    self.statistics['evictions'] += 1
+                    log.debug('Close idle connection to data source Id %i.', data_source_id)
+                    close_connection(connection)
+
+    def get_connection(self, data_source: dict):
+        """Check out a healthy connection to a data source, reusing an idle connection when possible."""
+        data_source_id = data_source['id']
+        semaphore = self.get_semaphore(data_source_id)
+        semaphore.acquire()
+        try:
+            while True:
+                with self.lock:
+                    self.evict_idle_connections()
+                    idle_connections = self.idle_connections.get(data_source_id)
+                    if not idle_connections:
+                        self.statistics['misses'] += 1
+                        break
+                    connection, data_source_type_id, _ = idle_connections.pop()
+
+                # Verify idle connection is still usable before reusing it
+                if is_connection_healthy(connection, data_source_type_id):
+                    with self.lock:
+                        self.statistics['hits'] += 1
+                    return connection
+
+                with self.lock:
+                    self.statistics['evictions'] += 1
+                close_connection(connection)
+
+            return DataSource().get_connection(
+                data_source['dataSourceTypeId'], data_source['connectionString'], data_source['login'], data_source['password'])
+
+        except Exception:
+            semaphore.release()
+            raise
+
+    def release_connection(self, data_source: dict, connection: object, is_reusable: bool = True):
+        """Check in a connection to the pool, or close it if it cannot be reused."""
+        data_source_id = data_source['id']
+        try:
+            if is_reusable:
+                # End transaction opened by the request before another session reuses the connection
+                end_transaction(connection)
+                with self.lock:
+                    idle_connections = self.idle_connections.setdefault(data_source_id, [])
+                    idle_connections.append((connection, data_source['dataSourceTypeId'], time.monotonic()))
+            else:
+                close_connection(connection)
+
+        except Exception:  # pylint: disable=broad-except
+            log.warning('Discard connection to data source Id %i.', data_source_id)
+            close_connection(connection)
+
+        finally:
+            self.get_semaphore(data_source_id).release()
+
+    def close(self):
+        """Close all idle connections and return pool statistics."""
+        with self.lock:
+            for idle_connections in self.idle_connections.values():
+                for connection, _, _ in idle_connections:
+                    close_connection(connection)
+            self.idle_connections.clear()
+            return dict(self.statistics)
+
+
+# Connection pool used by the batch currently executed, connections are opened and closed for each request without it
+CONNECTION_POOL = None
+
+
+def open_connection_pool():
+    """Create the connection pool used by a batch. Return None if pooling is disabled in configuration."""
+    global CONNECTION_POOL  # pylint: disable=global-statement
+    pool_size = int(utils.get_parameter('data_source', 'pool_size'))
+    if pool_size > 0:
+        idle_timeout = float(utils.get_parameter('data_source', 'pool_idle_timeout'))
+        CONNECTION_POOL = ConnectionPool(pool_size, idle_timeout)
+    return CONNECTION_POOL
+
+
+def close_connection_pool():
+    """Close the connection pool used by a batch and return its statistics."""
+    global CONNECTION_POOL  # pylint: disable=global-statement
+    statistics = None
+    if CONNECTION_POOL:
+        statistics = CONNECTION_POOL.close()
+        CONNECTION_POOL = None
+    return statistics
+
+
+def get_connection_pool():
+    """Return the connection pool of the batch, or None if there is none or if sessions are executed by another process than the batch."""
+    connection_pool = CONNECTION_POOL
+    if connection_pool and connection_pool.process_id == os.getpid():
+        return connection_pool
+    return None
+
+
+@contextmanager
+def connect(data_source: dict):
+    """Yield a connection to a data source, checked out from the connection pool when it is open."""
+    connection_pool = get_connection_pool()
+    if connection_pool:
+        connection = connection_pool.get_connection(data_source)
+        is_reusable = False
+        try:
+            yield connection
+            is_reusable = True
+        finally:
+            connection_pool.release_connection(data_source, connection, is_reusable)
+
+    else:
+        connection = DataSource().get_connection(
+            data_source['dataSourceTypeId'], data_source['connectionString'], data_source['login'], data_source['password'])
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+
+class RequestTracker:
+    """Track requests running on data sources so that they can be cancelled from another thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.is_cancelled = False
+        self.running_requests = []  # List of (connection, cursor)
+
+    def register(self, connection: object, cursor: object):
+        """Register a request before it is executed. Raise an exception if requests have been cancelled."""
+        with self.lock:
+            if self.is_cancelled:
+                raise Exception('Request cancelled.')
+            self.running_requests.append((connection, cursor))
+
+    def unregister(self, connection: object, cursor: object):
+        """Unregister a request once it is completed."""
+        with self.lock:
+            self.running_requests.remove((connection, cursor))
+
+    def cancel(self):
+        """Cancel running requests and prevent new requests from being executed."""
+        with self.lock:
+            self.is_cancelled = True
+            running_requests = list(self.running_requests)
+
+        for connection, cursor in running_requests:
+            log.info('Cancel request on data source.')
+            try:
+                if isinstance(connection, sqlite3.Connection):
+                    connection.interrupt()
+                else:
+                    cursor.cancel()
+            except Exception:  # pylint: disable=broad-except
+                log.warning('Request on data source could not be cancelled.')
+
+
+def quote_identifier(data_source_type_id: int, identifier: str):
+    """Quote a column name so that it can be added to a request sent to a data source, quote characters in the name are escaped."""
+    if data_source_type_id in [DataSourceType.HIVE_ID, DataSourceType.IMPALA_ID, DataSourceType.MARIADB_ID, DataSourceType.MYSQL_ID]:
+        quote = '`'
+    else:
+        quote = '"'
+    return quote + identifier.replace(quote, quote * 2) + quote
+
+
+def read_sql(connection: object, request: str, request_tracker: RequestTracker = None, parameters: tuple = None):
+    """Execute request on a data source and return its result in a data frame, similarly to pandas.read_sql. Parameters use qmark style."""
+    cursor = connection.cursor()
+    try:
+        if request_tracker:
+            request_tracker.register(connection, cursor)
+        try:
+            if parameters:
+                cursor.execute(request, parameters)
+            else:
+                cursor.execute(request)
+            column_names = [column[0] for column in cursor.description]
+            data_frame = pandas.DataFrame.from_records(cursor.fetchall(), columns=column_names, coerce_float=True)
+        finally:
+            if request_tracker:
+                request_tracker.unregister(connection, cursor)
+    finally:
+        cursor.close()
+
+    return data_frame
+
+
+def read_sql_chunks(connection: object, request: str, chunk_size: int, request_tracker: RequestTracker = None):
+    """Execute request on a data source and yield its result in data frames of at most chunk_size records."""
+    cursor = connection.cursor()
+    try:
+        if request_tracker:
+            request_tracker.register(connection, cursor)
+        try:
+            cursor.execute(request)
+            column_names = [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield pandas.DataFrame.from_records(rows, columns=column_names, coerce_float=True)
+        finally:
+            if request_tracker:
+                request_tracker.unregister(connection, cursor)
+    finally:
+        cursor.close()
+
+
+def is_connection_healthy(connection: object, data_source_type_id: int):
+    """Verify a connection to a data source is still usable."""
+    query = 'SELECT 1 FROM DUAL' if data_source_type_id == DataSourceType.ORACLE_ID else 'SELECT 1'
+    try:
+        cursor = connection.cursor()
+        cursor.execute(query)
+        cursor.fetchall()
+        cursor.close()
+        end_transaction(connection)
+        return True
+    except Exception:  # pylint: disable=broad-except
+        return False
+
+
+def end_transaction(connection: object):
+    """Roll back the current transaction of a connection which is not in autocommit mode."""
+    if not getattr(connection, 'autocommit', False):
+        connection.rollback()
+
+
+def close_connection(connection: object):
+    """Close a connection ignoring errors raised by broken connections."""
+    try:
+        connection.close()
+    except Exception:  # pylint: disable=broad-except
+        pass
+
 
 class DataSource:
     """Data source class."""
 
-    def get_connection(self, data_source_type_id: int, connection_string: str, login: str = None, password: str = None):
-        """Connect to a data source. Return a connection object."""
+    def get_connection(self, data_source_type_id: int, connection_string: str, login: str = None, password: str = None, timeout: int = 0):
+        """Connect to a data source. Return a connection object. Timeout is the login timeout in seconds of ODBC data sources, 0 means no timeout."""
 
         # Add login to connection string if it is not empty
         if login:
@@ -26,44 +371,44 @@ class DataSource:
 
         # Hive
         if data_source_type_id == DataSourceType.HIVE_ID:
-            connection = pyodbc.connect(connection_string, autocommit=True)
+            connection = pyodbc.connect(connection_string, autocommit=True, timeout=timeout)
             connection.setdecoding(pyodbc.SQL_CHAR, encoding='utf-8')
             connection.setencoding(encoding='utf-8')
 
         # Impala
         elif data_source_type_id == DataSourceType.IMPALA_ID:
-            connection = pyodbc.connect(connection_string)
+            connection = pyodbc.connect(connection_string, timeout=timeout)
             connection.setencoding(encoding='utf-8')
 
         # MariaDB
         elif data_source_type_id == DataSourceType.MARIADB_ID:
-            connection = pyodbc.connect(connection_string)
+            connection = pyodbc.connect(connection_string, timeout=timeout)
 
         # Microsoft SQL Server
         elif data_source_type_id == DataSourceType.MSSQL_ID:
-            connection = pyodbc.connect(connection_string)
+            connection = pyodbc.connect(connection_string, timeout=timeout)
 
         # MySQL
         elif data_source_type_id == DataSourceType.MYSQL_ID:
-            connection = pyodbc.connect(connection_string)
+            connection = pyodbc.connect(connection_string, timeout=timeout)
 
         # Oracle
         elif data_source_type_id == DataSourceType.ORACLE_ID:
-            connection = pyodbc.connect(connection_string)
+            connection = pyodbc.connect(connection_string, timeout=timeout)
 
         # PostgreSQL
         elif data_source_type_id == DataSourceType.POSTGRESQL_ID:
-            connection = pyodbc.connect(connection_string)
+            connection = pyodbc.connect(connection_string, timeout=timeout)
             connection.setdecoding(pyodbc.SQL_WCHAR, encoding='utf-8')
             connection.setencoding(encoding='utf-8')
 
         # SQLite
         elif data_source_type_id == DataSourceType.SQLITE_ID:
-            connection = sqlite3.connect(connection_string)
+            connection = sqlite3.connect(connection_string, check_same_thread=False)  # Connections can be pooled across threads
 
         # Teradata
         elif data_source_type_id == DataSourceType.TERADATA_ID:
-            connection = pyodbc.connect(connection_string)
+            connection = pyodbc.connect(connection_string, timeout=timeout)
             connection.setdecoding(pyodbc.SQL_CHAR, encoding='utf-8')
             connection.setdecoding(pyodbc.SQL_WCHAR, encoding='utf-8')
             connection.setdecoding(pyodbc.SQL_WMETADATA, encoding='utf-8')
@@ -82,9 +427,9 @@ class DataSource:
 
         # Get data source
         log.debug('Get data source.')
-        query = 'query{dataSourceById(id:data_source_id){dataSourceTypeId,connectionString,login,password}}'
-        query = query.replace('data_source_id', str(data_source_id))  # Use replace() instead of format() because of curly braces
-        response = utils.execute_graphql_request(query)
+        query = 'query getDataSource($id:Int!){dataSourceById(id:$id){dataSourceTypeId,connectionString,login,password}}'
+        variables = {'id': data_source_id}
+        response = utils.execute_graphql_request(query, variables)
 
         if response['data']['dataSourceById']:
             data_source = response['data']['dataSourceById']
@@ -93,9 +438,8 @@ class DataSource:
             login = data_source['login']
 
         # Get data source password
-        query = 'query{allDataSourcePasswords(condition:{id:data_source_id}){nodes{password}}}'
-        query = query.replace('data_source_id', str(data_source_id))  # Use replace() instead of format() because of curly braces
-        response = utils.execute_graphql_request(query)
+        query = 'query getDataSourcePassword($id:Int!){allDataSourcePasswords(condition:{id:$id}){nodes{password}}}'
+        response = utils.execute_graphql_request(query, variables)
 
         if response['data']['allDataSourcePasswords']['nodes'][0]:
             data_source = response['data']['allDataSourcePasswords']['nodes'][0]
@@ -107,9 +451,8 @@ class DataSource:
                 self.get_connection(data_source_type_id, connection_string, login, password)
 
                 log.info('Connection to data source succeeded.')
-                mutation = 'mutation{updateDataSourceById(input:{id:data_source_id,dataSourcePatch:{connectivityStatus:"Success"}}){dataSource{connectivityStatus}}}'
-                mutation = mutation.replace('data_source_id', str(data_source_id))  # Use replace() instead of format() because of curly braces
-                utils.execute_graphql_request(mutation)
+                mutation = 'mutation updateConnectivityStatus($id:Int!){updateDataSourceById(input:{id:$id,dataSourcePatch:{connectivityStatus:"Success"}}){dataSource{connectivityStatus}}}'
+                utils.execute_graphql_request(mutation, variables)
 
             except Exception:  # Pylint: disable=broad-except
                 log.error('Connection to data source failed.')
@@ -117,11 +460,125 @@ class DataSource:
                 log.error(error_message)
 
                 # Update connectivity status
-                mutation = 'mutation{updateDataSourceById(input:{id:data_source_id,dataSourcePatch:{connectivityStatus:"Failed"}}){dataSource{connectivityStatus}}}'
-                mutation = mutation.replace('data_source_id', str(data_source_id))  # Use replace() instead of format() because of curly braces
-                utils.execute_graphql_request(mutation)
+                mutation = 'mutation updateConnectivityStatus($id:Int!){updateDataSourceById(input:{id:$id,dataSourcePatch:{connectivityStatus:"Failed"}}){dataSource{connectivityStatus}}}'
+                utils.execute_graphql_request(mutation, variables)
 
         else:
             error_message = f'Data source Id {data_source_id} does not exist.'
             log.error(error_message)
             raise Exception(error_message)
+
+    def probe(self, data_source: dict, timeout: int):
+        """Connect to a data source and close the connection. Return its connectivity status and the connection latency in seconds."""
+        start_time = time.monotonic()
+        try:
+            connection = self.get_connection(
+                data_source['dataSourceTypeId'], data_source['connectionString'], data_source['login'], data_source['password'], timeout)
+            close_connection(connection)
+            connectivity_status = 'Success'
+
+        except Exception:  # pylint: disable=broad-except
+            log.error('Connection to data source %s failed.', data_source['name'])
+            log.debug(traceback.format_exc())
+            connectivity_status = 'Failed'
+
+        return connectivity_status, time.monotonic() - start_time
+
+    def get_data_sources(self, data_source_ids: List[int] = None):
+        """Get data sources along with their passwords, all data sources if no Id is provided. Only the passwords of the requested data sources are decrypted."""
+        log.debug('Get data sources.')
+        if data_source_ids is None:
+            query = 'query getDataSources{allDataSources{nodes{id,name,connectionString,login,dataSourceTypeId}},allDataSourcePasswords{nodes{id,password}}}'
+            response = utils.execute_graphql_request(query)
+            data_sources = response['data']['allDataSources']['nodes']
+            passwords = {}
+            for data_source_password in response['data']['allDataSourcePasswords']['nodes']:
+                passwords[data_source_password['id']] = data_source_password['password']
+        else:
+            data_source_ids = sorted(set(data_source_ids))
+            variable_definitions = ','.join(f'$id{index}:Int!' for index in range(len(data_source_ids)))
+            fields = []
+            for index in range(len(data_source_ids)):
+                fields.append(f'dataSource{index}:dataSourceById(id:$id{index}){{id,name,connectionString,login,dataSourceTypeId}}')
+                fields.append(f'password{index}:allDataSourcePasswords(condition:{{id:$id{index}}}){{nodes{{id,password}}}}')
+            query = f'query getDataSources({variable_definitions}){{{",".join(fields)}}}'
+            variables = {f'id{index}': data_source_id for index, data_source_id in enumerate(data_source_ids)}
+            response = utils.execute_graphql_request(query, variables)
+            data_sources = []
+            passwords = {}
+            for index, data_source_id in enumerate(data_source_ids):
+                if response['data'][f'dataSource{index}']:
+                    data_sources.append(response['data'][f'dataSource{index}'])
+                else:
+                    log.error('Data source Id %i does not exist.', data_source_id)
+                for data_source_password in response['data'][f'password{index}']['nodes']:
+                    passwords[data_source_password['id']] = data_source_password['password']
+
+        for data_source in data_sources:
+            data_source['password'] = passwords.get(data_source['id'])
+        return data_sources
+
+    def probe_many(self, data_sources: List[dict], concurrency: int, timeout: int):
+        """
+        Probe data sources concurrently on daemon threads, so that a driver ignoring its login timeout cannot delay the end of the process.
+        Return a dictionary of connectivity status and latency per data source Id, data sources which could not be probed before the overall timeout are missing.
+        """
+        log.info('Test connectivity to %i data source(s) with %i concurrent probes.', len(data_sources), concurrency)
+        pending_data_sources = queue.Queue()
+        for data_source in data_sources:
+            pending_data_sources.put(data_source)
+        probe_results = {}
+        is_cancelled = threading.Event()
+
+        def run_probes():
+            while not is_cancelled.is_set():
+                try:
+                    data_source = pending_data_sources.get_nowait()
+                except queue.Empty:
+                    return
+                probe_results[data_source['id']] = self.probe(data_source, timeout)
+
+        threads = [threading.Thread(target=run_probes, daemon=True) for _ in range(min(concurrency, len(data_sources)))]
+        for thread in threads:
+            thread.start()
+
+        # Probes are queued when there are more data sources than threads, the overall timeout accounts for it
+        # Probes which have not started before the overall timeout are cancelled
+        deadline = time.monotonic() + timeout * (math.ceil(len(data_sources) / concurrency) + 1)
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        is_cancelled.set()
+        return dict(probe_results)
+
+    def test_many(self, data_source_ids: List[int] = None):
+        """
+        Test connectivity to several data sources concurrently, all data sources if no Id is provided.
+        Update their connectivity status in a single request and return a dictionary of connectivity status and latency per data source Id.
+        """
+        data_sources = self.get_data_sources(data_source_ids)
+        if not data_sources:
+            return {}
+
+        concurrency = int(utils.get_parameter('data_source', 'test_concurrency'))
+        timeout = int(utils.get_parameter('data_source', 'test_timeout'))
+        probe_results = self.probe_many(data_sources, concurrency, timeout)
+
+        # Update connectivity status of all data sources in a single request
+        results = {}
+        mutation_buffer = utils.MutationBuffer()
+        for data_source in data_sources:
+            if data_source['id'] in probe_results:
+                connectivity_status, latency = probe_results[data_source['id']]
+                log.info('Data source %s connectivity status is %s, connection took %.3f seconds.', data_source['name'], connectivity_status, latency)
+            else:
+                connectivity_status, latency = 'Failed', None
+                log.error('Connection to data source %s timed out.', data_source['name'])
+
+            results[data_source['id']] = {'connectivityStatus': connectivity_status, 'latency': latency}
+            mutation_input = {'id': data_source['id'], 'dataSourcePatch': {'connectivityStatus': connectivity_status}}
+            mutation_buffer.add('updateDataSourceById', 'UpdateDataSourceByIdInput', mutation_input, 'dataSource{id,connectivityStatus}')
+        mutation_buffer.flush()
+
+        nb_failed = len([result for result in results.values() if result['connectivityStatus'] == 'Failed'])
+        log.info('Connectivity test completed for %i data source(s), %i failed.', len(results), nb_failed)
+        return results
@@ -4,6 +4,8 @@ from datetime import datetime
 import pandas
 from indicator import Indicator
 from session import update_session_status
+from utils import MutationBuffer
+import utils
 
 # Load logging configuration
 log = logging.getLogger(__name__)
@@ -12,8 +14,11 @@ log = logging.getLogger(__name__)
 class Freshness(Indicator):
     """Class used to compute indicators of type freshness."""
 
-    def execute(self, session: dict):
+    def execute(self, session: dict, mutation_buffer: MutationBuffer = None):
         """Execute indicator of type freshness."""
+        if mutation_buffer is None:
+            mutation_buffer = MutationBuffer()
+
         # Update session status to running
         session_id: int = session['id']
         indicator_id: int = session['indicatorId']
@@ -24,39 +29,72 @@ class Freshness(Indicator):
         # Verify if the list of indicator parameters is valid
         indicator_type_id = session['indicatorByIndicatorId']['indicatorTypeId']
         parameters = session['indicatorByIndicatorId']['parametersByIndicatorId']['nodes']
-        parameters = super().verify_indicator_parameters(indicator_type_id, parameters)
-
-        # Get target data
-        dimensions = parameters[4]
-        measures = parameters[5]
-        target = parameters[8]
-        target_request = parameters[9]
-        target_data = super().get_data_frame(target, target_request, dimensions, measures)
-
-        # Evaluate freshness
-        alert_operator = parameters[1]  # Alert operator
-        alert_threshold = parameters[2]  # Alert threshold
-        log.info('Evaluate freshness of target data source.')
-        result_data = self.evaluate_freshness(target_data, measures, alert_operator, alert_threshold)
-
-        # Compute session result
-        nb_records_alert = super().compute_session_result(session_id, alert_operator, alert_threshold, result_data)
+        config = super().get_indicator_config(indicator_type_id, parameters)
+
+        # Get target data and evaluate freshness
+        dimensions = config.dimensions
+        measures = config.measures
+        target = config.target
+        target_request = config.target_request
+        alert_operator = config.alert_operator
+        alert_threshold = config.alert_threshold
+        chunk_size = int(utils.get_parameter('indicator', 'chunk_size'))
+        indicator_state = None  # Arguments of save_indicator_state in incremental mode
+
+        if config.watermark:
+            # Merge records above the watermark of the last successful session with the records of previous sessions
+            log.info('Evaluate freshness of new records of target data source.')
+            state_hash = super().get_state_hash(config)
+            state = super().get_indicator_state(indicator_id, state_hash)
+            target_data, watermark = super().get_incremental_data_frame(
+                target, target_request, dimensions, measures, config.watermark, state['watermark'])
+            target_data = self.merge_freshness(state['data'], target_data, dimensions, measures)
+            state_data = target_data.copy()
+            result_data = self.evaluate_freshness(target_data, measures, alert_operator, alert_threshold)
+
+            # Compute session result
+            nb_records_alert = super().compute_session_result(session_id, alert_operator, alert_threshold, result_data, mutation_buffer)
+            indicator_state = (indicator_id, state_hash, watermark, len(result_data), nb_records_alert, state_data)
+
+        elif chunk_size > 0:
+            # Stream target data by chunks and keep only records in alert, all chunks are compared to the same timestamp
+            log.info('Evaluate freshness of target data source by chunks.')
+            current_timestamp = datetime.utcnow()
+            target_data = super().get_data_frame_chunks(target, target_request, dimensions, measures, chunk_size)
+            nb_records, nb_records_alert, result_data = super().evaluate_data_frame_chunks(
+                target_data, lambda data_frame: self.evaluate_freshness(data_frame, measures, alert_operator, alert_threshold, current_timestamp), session_id)
+
+            # Compute session result
+            super().create_session_result(session_id, alert_operator, alert_threshold, nb_records, nb_records_alert, mutation_buffer)
+
+        else:
+            target_data = super().get_data_frame(target, target_request, dimensions, measures)
+            log.info('Evaluate freshness of target data source.')
+            result_data = self.evaluate_freshness(target_data, measures, alert_operator, alert_threshold)
+
+            # Compute session result
+            nb_records_alert = super().compute_session_result(session_id, alert_operator, alert_threshold, result_data, mutation_buffer)
 
         # Send e-mail alert
         if nb_records_alert != 0:
             indicator_name = session['indicatorByIndicatorId']['name']
-            distribution_list = parameters[3]  # Distribution list
+            distribution_list = config.distribution_list
             super().send_alert(indicator_id, indicator_name, session_id, distribution_list, alert_operator, alert_threshold, nb_records_alert, result_data)
 
-        # Update session status to succeeded
+        # Update session status to succeeded along with session results
         log.debug('Update session status to Succeeded.')
-        update_session_status(session_id, 'Succeeded')
+        update_session_status(session_id, 'Succeeded', mutation_buffer)
+        mutation_buffer.flush()
+
+        # Persist state for the next session only once session results are saved, otherwise new records would be skipped
+        if indicator_state:
+            super().save_indicator_state(*indicator_state)
         log.info('Session Id %i for indicator Id %i completed successfully.', session_id, indicator_id)
 
-    def evaluate_freshness(self, target_data: pandas.DataFrame, measures: str, alert_operator: str, alert_threshold: str):
+    def evaluate_freshness(self, target_data: pandas.DataFrame, measures: str, alert_operator: str, alert_threshold: str, current_timestamp: datetime = None):
         """Compute specificities of freshness indicator and return results in a data frame."""
         result_data = target_data
-        result_data['current_timestamp'] = datetime.utcnow()
+        result_data['current_timestamp'] = current_timestamp or datetime.utcnow()
 
         # Compute delta in minutes and delta description between source and target measures
         for measure in measures:
@@ -74,12 +112,27 @@ class Freshness(Indicator):
             result_data[delta_column] = round(delta_seconds/60).astype(int)  # Compute delta in minutes
             result_data[delta_description_column] = pandas.to_timedelta(delta_seconds, unit='s')  # Format delta
 
-        # For each record and measure in data frame test if alert must be sent and update alert column
-        result_data['Alert'] = False
+        # Test if alert must be sent for each record
+        delta_columns = [measure + '_delta_minutes' for measure in measures]
+        result_data['Alert'] = self.evaluate_alert(result_data[delta_columns], alert_operator, alert_threshold)
+
+        return result_data
+
+    def merge_freshness(self, state_data: pandas.DataFrame, target_data: pandas.DataFrame, dimensions: str, measures: str):
+        """Merge records of previous sessions with new records, keeping the most recent timestamp of each measure per dimensions."""
+        if state_data is not None:
+            for measure in measures:
+                state_data[measure] = pandas.to_datetime(state_data[measure], unit='us')  # Timestamps are persisted as epoch in microseconds
+
+        result_data = pandas.concat([state_data, target_data], ignore_index=True)
         for measure in measures:
-            for row_num in result_data.index:
-                measure_value = result_data.loc[row_num, measure + '_delta_minutes']
-                if self.is_alert(measure_value, alert_operator, alert_threshold):
-                    result_data.loc[row_num, 'Alert'] = True
+            result_data[measure] = pandas.to_datetime(result_data[measure])
+
+        if dimensions:
+            for dimension in dimensions:
+                result_data[dimension] = result_data[dimension].astype(str)  # Categoricals cannot be merged if compact mode is enabled
+            result_data = result_data.groupby(dimensions, as_index=False, sort=False)[measures].max()
+        else:
+            result_data = result_data[measures].max().to_frame().T.infer_objects()
 
         return result_data
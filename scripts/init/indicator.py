@@ -1,29 +1,255 @@
 """Manage class and methods for all types of indicators."""
 from ast import literal_eval
-from typing import List
+from collections import OrderedDict
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Callable, Iterable, List, Tuple
+import csv
+import glob
+import gzip
+import hashlib
+import io
+import json
 import logging
+import numbers
+import operator
 import os
+import re
+import threading
 import pandas
-from data_source import DataSource
+from data_source import RequestTracker, connect, get_data_source, quote_identifier, read_sql, read_sql_chunks
 from constants import IndicatorType
 import utils
 
 # Load logging configuration
 log = logging.getLogger(__name__)
 
+# Number of records per chunk used to spill data frames to disk when chunk size is not configured
+DEFAULT_SPILL_CHUNK_SIZE = 100000
+
+# Number of records of session result details loaded in the database per COPY statement
+RESULT_DETAIL_BATCH_SIZE = 100000
+
+# Supported alert operators and their comparison functions
+ALERT_OPERATORS = {
+    '==': operator.eq,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '!=': operator.ne
+}
+
+# Parameter types referential, loaded once per process and reloaded when an unknown parameter type is requested
+PARAMETER_TYPES = {}
+PARAMETER_TYPES_LOCK = threading.Lock()
+
+
+def get_parameter_types(parameter_type_ids: List[int]):
+    """Return a dictionary of parameter type names for a list of parameter type Ids."""
+    with PARAMETER_TYPES_LOCK:
+        if any(parameter_type_id not in PARAMETER_TYPES for parameter_type_id in parameter_type_ids):
+            log.debug('Load parameter types referential.')
+            query = 'query getParameterTypes{allParameterTypes{nodes{id,name}}}'
+            response = utils.execute_graphql_request(query)
+            PARAMETER_TYPES.clear()
+            for parameter_type in response['data']['allParameterTypes']['nodes']:
+                PARAMETER_TYPES[parameter_type['id']] = parameter_type['name']
+
+        return {parameter_type_id: PARAMETER_TYPES[parameter_type_id] for parameter_type_id in parameter_type_ids}
+
+
+def clear_parameter_types():
+    """Invalidate the parameter types referential."""
+    with PARAMETER_TYPES_LOCK:
+        PARAMETER_TYPES.clear()
+
+
+def normalize_request(request: str):
+    """Remove trailing semicolons and collapse white spaces outside of string literals so that identical requests share the same text."""
+    parts = re.split(r"('(?:[^']|'')*')", request.strip().rstrip(';'))
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r'\s+', ' ', parts[i])
+    return ''.join(parts).strip()
+
+
+class ResultCache:
+    """
+    Memory bounded cache of data frames extracted by the sessions of a batch, least recently used data frames being evicted first.
+    Identical extractions requested concurrently are executed once.
+    """
+
+    def __init__(self, max_size: int):
+        self.process_id = os.getpid()
+        self.max_size = max_size  # Maximum size in bytes of cached data frames
+        self.size = 0
+        self.lock = threading.Lock()
+        self.data_frames = OrderedDict()  # Key: (data frame, size in bytes)
+        self.extractions = {}  # Key: future of the extraction in progress
+        self.statistics = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get_data_frame(self, key: tuple, extract_function: Callable[[], pandas.DataFrame]):
+        """
+        Return a copy of the data frame cached for key, so that sessions can modify it. If it is not cached, extract it with extract function
+        or wait for the same extraction started by another session. If that extraction fails, it is executed again by the waiting sessions.
+        """
+        data_frame = None
+        is_extracted = False  # True if the extraction is executed by this session
+        with self.lock:
+            if key in self.data_frames:
+                self.data_frames.move_to_end(key)
+                self.statistics['hits'] += 1
+                data_frame = self.data_frames[key][0]
+            elif key in self.extractions:
+                self.statistics['hits'] += 1
+                future = self.extractions[key]
+            else:
+                self.statistics['misses'] += 1
+                future = Future()
+                self.extractions[key] = future
+                is_extracted = True
+
+        if data_frame is not None:
+            log.debug('Use cached result of request on data source %s.', key[0])
+            return data_frame.copy()
+
+        if is_extracted:
+            try:
+                data_frame = extract_function()
+            except Exception as exception:
+                with self.lock:
+                    del self.extractions[key]
+                future.set_exception(exception)
+                raise
+            self.add(key, data_frame)
+            future.set_result(data_frame)
+            return data_frame.copy()
+
+        log.debug('Wait for result of request on data source %s executed by another session.', key[0])
+        try:
+            return future.result().copy()
+        except Exception:  # pylint: disable=broad-except
+            return self.get_data_frame(key, extract_function)
+
+    def add(self, key: tuple, data_frame: pandas.DataFrame):
+        """Cache a data frame and evict least recently used data frames until the cache fits its maximum size."""
+        size = int(data_frame.memory_usage(deep=True).sum())
+        with self.lock:
+            del self.extractions[key]
+            if size > self.max_size:
+                log.debug('Result of request on data source %s is too large to be cached.', key[0])
+                return
+
+            self.data_frames[key] = (data_frame, size)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self.data_frames.popitem(last=False)
+                self.size -= evicted_size
+                self.statistics['evictions'] += 1
+
+    def close(self):
+        """Remove all data frames from the cache and return its statistics."""
+        with self.lock:
+            self.data_frames.clear()
+            self.size = 0
+            return dict(self.statistics)
+
+
+# Result cache used by the batch currently executed, extractions are executed for each session without it
+RESULT_CACHE = None
+
+
+def open_result_cache():
+    """Create the result cache used by a batch. Return None if result cache is disabled in configuration."""
+    global RESULT_CACHE  # pylint: disable=global-statement
+    result_cache_size = int(utils.get_parameter('indicator', 'result_cache_size'))
+    if result_cache_size > 0:
+        RESULT_CACHE = ResultCache(result_cache_size * 1024 * 1024)
+    return RESULT_CACHE
+
+
+def close_result_cache():
+    """Clear the result cache used by a batch and return its statistics."""
+    global RESULT_CACHE  # pylint: disable=global-statement
+    statistics = None
+    if RESULT_CACHE:
+        statistics = RESULT_CACHE.close()
+        RESULT_CACHE = None
+    return statistics
+
+
+def get_result_cache():
+    """Return the result cache of the batch, or None if there is none or if sessions are executed by another process than the batch."""
+    result_cache = RESULT_CACHE
+    if result_cache and result_cache.process_id == os.getpid():
+        return result_cache
+    return None
+
+
+def encode_watermark(watermark: object):
+    """Convert a watermark to a JSON serializable dictionary which preserves its data type."""
+    if watermark is None:
+        return None
+    if isinstance(watermark, datetime):
+        return {'type': 'timestamp', 'value': pandas.Timestamp(watermark).isoformat()}
+    if isinstance(watermark, numbers.Integral):
+        return {'type': 'integer', 'value': int(watermark)}
+    if isinstance(watermark, (Decimal, numbers.Real)):
+        return {'type': 'decimal', 'value': str(watermark)}
+    return {'type': 'text', 'value': str(watermark)}
+
+
+def decode_watermark(watermark: dict):
+    """Convert a dictionary created by encode_watermark to a watermark which can be used as request parameter."""
+    if watermark is None:
+        return None
+    if watermark['type'] == 'timestamp':
+        return pandas.Timestamp(watermark['value']).to_pydatetime()
+    if watermark['type'] == 'integer':
+        return int(watermark['value'])
+    if watermark['type'] == 'decimal':
+        return Decimal(watermark['value'])
+    return watermark['value']
+
+
+class IndicatorConfig:
+    """Verified and parsed parameters of an indicator."""
+    # pylint: disable=R0902,R0903
+    __slots__ = [
+        'alert_operator', 'alert_threshold', 'alert_function', 'distribution_list', 'dimensions', 'measures',
+        'source', 'source_request', 'target', 'target_request', 'watermark']
+
+    def __init__(self, parameters: dict, alert_function: callable):
+        self.alert_operator = parameters[1]  # Alert operator
+        self.alert_threshold = parameters[2]  # Alert threshold
+        self.alert_function = alert_function
+        self.distribution_list = parameters[3]  # Distribution list
+        self.dimensions = parameters[4]  # Dimensions
+        self.measures = parameters[5]  # Measures
+        self.source = parameters.get(6)  # Source
+        self.source_request = parameters.get(7)  # Source request
+        self.target = parameters[8]  # Target
+        self.target_request = parameters[9]  # Target request
+        self.watermark = parameters.get(10)  # Watermark
+
+
+@lru_cache(maxsize=1024)
+def compile_indicator_config(indicator_type_id: int, parameters: Tuple[Tuple[int, str]]):
+    """Verify and parse indicator parameters once for each distinct set of parameters."""
+    indicator = Indicator()
+    parameters = [{'parameterTypeId': parameter_type_id, 'value': value} for parameter_type_id, value in parameters]
+    parameters = indicator.verify_indicator_parameters(indicator_type_id, parameters)
+    alert_function = indicator.get_alert_function(parameters[1])
+    return IndicatorConfig(parameters, alert_function)
+
 
 class Indicator:
     """Base class used to compute indicators, regardless of their type."""
 
     def verify_indicator_parameters(self, indicator_type_id: int, parameters: List[dict]):
         """Verify if the list of indicator parameters is valid and return them as a dictionary."""
-        # Build dictionary of parameter types referential
-        query = 'query{allParameterTypes{nodes{id,name}}}'
-        response = utils.execute_graphql_request(query)
-        parameter_types_referential = {}
-        for parameter_type in response['data']['allParameterTypes']['nodes']:
-            parameter_types_referential[parameter_type['id']] = parameter_type['name']
-
         # Build dictionary of indicator parameters
         indicator_parameters = {}
         for parameter in parameters:
@@ -34,19 +260,26 @@ class Indicator:
         missing_parameters = []
         for parameter_type_id in [1, 2, 3, 4, 5, 8, 9]:
             if parameter_type_id not in indicator_parameters:
-                parameter_type = parameter_types_referential[parameter_type_id]
-                missing_parameters.append(parameter_type)
+                missing_parameters.append(parameter_type_id)
 
         # Verify parameters specific to completeness and latency indicator types
         # Source, Source request
         if indicator_type_id in [IndicatorType.COMPLETENESS, IndicatorType.LATENCY]:
             for parameter_type_id in [6, 7]:
                 if parameter_type_id not in indicator_parameters:
-                    parameter_type = parameter_types_referential[parameter_type_id]
-                    missing_parameters.append(parameter_type)
+                    missing_parameters.append(parameter_type_id)
+
+        # Verify incremental mode is only used by freshness and validity indicator types
+        # Watermark
+        if 10 in indicator_parameters and indicator_type_id not in [IndicatorType.FRESHNESS, IndicatorType.VALIDITY]:
+            error_message = 'Watermark parameter is only supported by freshness and validity indicators.'
+            log.error(error_message)
+            raise Exception(error_message)
 
         if missing_parameters:
-            missing_parameters = ', '.join(missing_parameters)
+            # Get parameter type names from the parameter types referential
+            missing_parameters = get_parameter_types(missing_parameters)
+            missing_parameters = ', '.join(missing_parameters.values())
             error_message = f'Missing parameters: {missing_parameters}.'
             log.error(error_message)
             raise Exception(error_message)
@@ -56,107 +289,425 @@ class Indicator:
         indicator_parameters[4] = literal_eval(indicator_parameters[4])  # Dimensions
         indicator_parameters[5] = literal_eval(indicator_parameters[5])  # Measures
 
+        # Verify watermark column is one of the dimensions or measures so that it is returned by the target request
+        if 10 in indicator_parameters and indicator_parameters[10] not in indicator_parameters[4] + indicator_parameters[5]:
+            error_message = f'Watermark {indicator_parameters[10]} must be one of the dimensions or measures.'
+            log.error(error_message)
+            raise Exception(error_message)
+
         return indicator_parameters
 
-    def get_data_frame(self, data_source: pandas.DataFrame, request: str, dimensions: str, measures: str):
-        """Get data from data source. Return a formatted data frame according to dimensions and measures parameters."""
+    def get_indicator_config(self, indicator_type_id: int, parameters: List[dict]):
+        """Return the verified and parsed parameters of an indicator, compiled once for each distinct set of parameters."""
+        parameters = tuple(sorted((parameter['parameterTypeId'], parameter['value']) for parameter in parameters))
+        return compile_indicator_config(indicator_type_id, parameters)
+
+    def get_data_frame(self, data_source: str, request: str, dimensions: str, measures: str, request_tracker: RequestTracker = None):
+        """
+        Get data from data source, or from the result cache of the batch if the same extraction has already been executed by another session.
+        Return a formatted data frame according to dimensions and measures parameters.
+        """
+        result_cache = get_result_cache()
+        if result_cache:
+            key = (data_source, normalize_request(request), tuple(dimensions), tuple(measures))
+            return result_cache.get_data_frame(key, lambda: self.extract_data_frame(data_source, request, dimensions, measures, request_tracker))
+
+        return self.extract_data_frame(data_source, request, dimensions, measures, request_tracker)
+
+    def extract_data_frame(self, data_source: str, request: str, dimensions: str, measures: str, request_tracker: RequestTracker = None):
+        """Execute request on data source. Return a formatted data frame according to dimensions and measures parameters."""
         # Get data source credentials
-        query = '{dataSourceByName(name:"data_source"){id,connectionString,login,dataSourceTypeId}}'
-        query = query.replace('data_source', data_source)
-        response = utils.execute_graphql_request(query)
-
-        # Get connection object
-        if response['data']['dataSourceByName']:
-            data_source_id = response['data']['dataSourceByName']['id']
-            data_source_type_id = response['data']['dataSourceByName']['dataSourceTypeId']
-            connection_string = response['data']['dataSourceByName']['connectionString']
-            login = response['data']['dataSourceByName']['login']
-
-        # Get data source password
-        query = 'query{allDataSourcePasswords(condition:{id:data_source_id}){nodes{password}}}'
-        query = query.replace('data_source_id', str(data_source_id))  # Use replace() instead of format() because of curly braces
-        response = utils.execute_graphql_request(query)
-
-        if response['data']['allDataSourcePasswords']['nodes'][0]:
-            data_source = response['data']['allDataSourcePasswords']['nodes'][0]
-            password = data_source['password']
-
-            log.info('Connect to data source.')
-            data_source = DataSource()
-            connection = data_source.get_connection(data_source_type_id, connection_string, login, password)
-        else:
-            error_message = f'Data source {data_source} does not exist.'
+        data_source_definition = get_data_source(data_source)
+
+        # Get data frame
+        log.info('Connect to data source and execute request.')
+        with connect(data_source_definition) as connection:
+            data_frame = read_sql(connection, request, request_tracker)
+
+        if data_frame.empty:
+            error_message = f'Request on data source {data_source} returned no data.'
             log.error(error_message)
+            log.debug('Request: %s.', request)
             raise Exception(error_message)
 
+        return self.format_data_frame(data_frame, dimensions, measures)
+
+    def get_data_frame_chunks(self, data_source: str, request: str, dimensions: str, measures: str, chunk_size: int, request_tracker: RequestTracker = None):
+        """Get data from data source by chunks. Yield formatted data frames of at most chunk_size records."""
+        # Get data source credentials
+        data_source_definition = get_data_source(data_source)
+
+        # Get data frame chunks
+        log.info('Connect to data source and execute request by chunks of %i records.', chunk_size)
+        is_empty = True
+        with connect(data_source_definition) as connection:
+            for data_frame in read_sql_chunks(connection, request, chunk_size, request_tracker):
+                is_empty = False
+                yield self.format_data_frame(data_frame, dimensions, measures)
+
+        if is_empty:
+            error_message = f'Request on data source {data_source} returned no data.'
+            log.error(error_message)
+            log.debug('Request: %s.', request)
+            raise Exception(error_message)
+
+    def get_incremental_data_frame(self, data_source: str, request: str, dimensions: str, measures: str, watermark_column: str, watermark: object):
+        """
+        Get records above the watermark from data source, the request being filtered on the watermark column, or all records if there is no watermark yet.
+        Return a formatted data frame along with the new watermark, which is the maximum value of the watermark column or the previous watermark if there is no new record.
+        """
+        # Get data source credentials
+        data_source_definition = get_data_source(data_source)
+
+        # Filter request on watermark, it is sent as a parameter to preserve its data type
+        # Watermark column is quoted so that it cannot alter the request, it must match the column name returned by the request
+        parameters = None
+        if watermark is not None:
+            quoted_column = quote_identifier(data_source_definition['dataSourceTypeId'], watermark_column)
+            request = f'SELECT * FROM ({self.strip_request(request)}) incremental_data WHERE {quoted_column} > ?'
+            parameters = (watermark,)
+
         # Get data frame
-        log.info('Execute request on data source.')
-        data_frame = pandas.read_sql(request, connection)
-        connection.close()
+        log.info('Connect to data source and execute request for records above watermark %s.', watermark)
+        with connect(data_source_definition) as connection:
+            data_frame = read_sql(connection, request, parameters=parameters)
 
-        if data_frame.empty:
+        if watermark_column not in data_frame.columns:
+            error_message = f'Watermark column {watermark_column} is not returned by request on data source {data_source}.'
+            log.error(error_message)
+            raise ValueError(error_message)
+
+        if not data_frame.empty:
+            watermark = data_frame[watermark_column].max()
+        elif watermark is None:
             error_message = f'Request on data source {data_source} returned no data.'
             log.error(error_message)
             log.debug('Request: %s.', request)
             raise Exception(error_message)
 
-        # Format data frame
+        log.info('Request returned %i new record(s), watermark is %s.', len(data_frame), watermark)
+        return self.format_data_frame(data_frame, dimensions, measures), watermark
+
+    def strip_request(self, request: str):
+        """Remove trailing semicolons and white spaces from a request so that it can be used as a subquery."""
+        return request.strip().rstrip(';').rstrip()
+
+    def format_data_frame(self, data_frame: pandas.DataFrame, dimensions: str, measures: str):
+        """Name data frame columns according to dimensions and measures parameters and convert dimension values to string."""
         log.debug('Format data frame.')
         column_names = dimensions + measures
         data_frame.columns = column_names
         for column in dimensions:
             data_frame[column] = data_frame[column].astype(str)  # Convert dimension values to string
 
+        # Reduce memory footprint of data frame if compact mode is enabled
+        if int(utils.get_parameter('indicator', 'compact')):
+            memory_usage = data_frame.memory_usage(deep=True).sum()
+            data_frame = self.compact_data_frame(data_frame, dimensions, measures)
+            compact_memory_usage = data_frame.memory_usage(deep=True).sum()
+            log.info('Compacted data frame of %i records from %i bytes to %i bytes.', len(data_frame), memory_usage, compact_memory_usage)
+
         return data_frame
 
+    def compact_data_frame(self, data_frame: pandas.DataFrame, dimensions: str, measures: str):
+        """
+        Convert dimensions to categoricals and downcast numeric measures to the narrowest data type which preserves their values.
+        Float measures are only downcast when all their values can be represented exactly.
+        """
+        for column in dimensions:
+            data_frame[column] = data_frame[column].astype('category')
+
+        for column in measures:
+            series = data_frame[column]
+            if pandas.api.types.is_integer_dtype(series):
+                data_frame[column] = pandas.to_numeric(series, downcast='integer')
+            elif pandas.api.types.is_float_dtype(series):
+                downcast_series = series.astype('float32')
+                if ((downcast_series == series) | series.isnull()).all():
+                    data_frame[column] = downcast_series
+
+        return data_frame
+
+    def get_alert_function(self, alert_operator: str):
+        """Return the comparison function corresponding to the alert operator."""
+        if alert_operator not in ALERT_OPERATORS:
+            error_message = f'Invalid alert operator {alert_operator}.'
+            log.error(error_message)
+            raise ValueError(error_message)
+        return ALERT_OPERATORS[alert_operator]
+
+    def get_data_frames(self, *extractions: Tuple[str, str, List[str], List[str]]):
+        """
+        Get data from several data sources concurrently, each extraction being a tuple (data source, request, dimensions, measures).
+        Return the list of formatted data frames. If one extraction fails, cancel the other requests and raise its error.
+        """
+        return self.execute_extractions(self.get_data_frame, extractions)
+
+    def spill_data_frames(self, directory: str, nb_partitions: int, chunk_size: int, *extractions: Tuple[str, str, List[str], List[str]]):
+        """
+        Get data from several data sources concurrently and spill it by chunks to partition files in directory.
+        Data of the n-th extraction is written to files prefixed by n. Return the list of numbers of records extracted.
+        """
+        extract_functions = []
+        for extraction_number in range(len(extractions)):
+            extract_functions.append(self.get_spill_function(directory, nb_partitions, chunk_size, extraction_number))
+        return self.execute_extractions(extract_functions, extractions)
+
+    def get_spill_function(self, directory: str, nb_partitions: int, chunk_size: int, extraction_number: int):
+        """Return a function which extracts data by chunks and spills it to partition files in directory."""
+        def spill_data_frame(data_source: str, request: str, dimensions: List[str], measures: List[str], request_tracker: RequestTracker = None):
+            nb_records = 0
+            data_frames = self.get_data_frame_chunks(data_source, request, dimensions, measures, chunk_size, request_tracker)
+            for chunk_number, data_frame in enumerate(data_frames):
+                self.partition_data_frame(data_frame, dimensions, nb_partitions, directory, f'{extraction_number}', chunk_number)
+                nb_records += len(data_frame)
+            log.info('Spilled %i records from data source %s to disk.', nb_records, data_source)
+            return nb_records
+        return spill_data_frame
+
+    def execute_extractions(self, extract_functions: Callable, extractions: List[Tuple[str, str, List[str], List[str]]]):
+        """
+        Execute extract functions concurrently, one per extraction. A single function can be provided for all extractions.
+        Return the list of results. If one extraction fails, cancel the other requests and raise its error.
+        """
+        if callable(extract_functions):
+            extract_functions = [extract_functions] * len(extractions)
+
+        request_tracker = RequestTracker()
+        with ThreadPoolExecutor(max_workers=len(extractions)) as executor:
+            futures = [executor.submit(extract_function, *extraction, request_tracker=request_tracker)
+                       for extract_function, extraction in zip(extract_functions, extractions)]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+
+            for future in futures:
+                if future in done and future.exception():
+                    request_tracker.cancel()
+                    raise future.exception()
+
+        return [future.result() for future in futures]
+
+    def partition_data_frame(self, data_frame: pandas.DataFrame, dimensions: List[str], nb_partitions: int, directory: str, prefix: str, chunk_number: int):
+        """
+        Split data frame into partitions based on the hash of its dimensions and write each partition to a pickle file in directory.
+        Records sharing the same dimensions are always written to the same partition. An empty schema file is written for the first chunk.
+        """
+        if chunk_number == 0:
+            data_frame.iloc[0:0].to_pickle(os.path.join(directory, f'{prefix}_schema.pkl'))
+
+        partition_numbers = pandas.util.hash_pandas_object(data_frame[dimensions], index=False) % nb_partitions
+        for partition_number, partition_data in data_frame.groupby(partition_numbers.values):
+            file_path = os.path.join(directory, f'{prefix}_{partition_number}_{chunk_number}.pkl')
+            partition_data.to_pickle(file_path)
+
+    def read_partition(self, directory: str, prefix: str, partition_number: int):
+        """Read all chunks of a partition written to directory and return them in a single data frame."""
+        data_frames = [pandas.read_pickle(os.path.join(directory, f'{prefix}_schema.pkl'))]
+        for file_path in sorted(glob.glob(os.path.join(directory, f'{prefix}_{partition_number}_*.pkl'))):
+            data_frames.append(pandas.read_pickle(file_path))
+        return pandas.concat(data_frames, ignore_index=True)
+
+    def read_partitions(self, directory: str, nb_partitions: int, prefixes: Tuple[str, ...] = ('0', '1')):
+        """Yield a tuple of data frames for each partition written to directory, one data frame per prefix. Skip empty partitions."""
+        for partition_number in range(nb_partitions):
+            data_frames = tuple(self.read_partition(directory, prefix, partition_number) for prefix in prefixes)
+            if any(not data_frame.empty for data_frame in data_frames):
+                yield data_frames
+
     def is_alert(self, measure_value: str, alert_operator: str, alert_threshold: str):
         """
         Compare measure to alert threshold based on the alert operator.
         Return True if an alert must be sent, False otherwise.
         Supported alert operators are: ==, >, >=, <, <=, !=
         """
-        return eval(str(measure_value) + alert_operator + str(alert_threshold)) # pylint: disable=W0123
+        alert_function = self.get_alert_function(alert_operator)
+        return alert_function(float(measure_value), float(alert_threshold))
+
+    def evaluate_alert(self, measure_data: pandas.DataFrame, alert_operator: str, alert_threshold: str):
+        """
+        Compare all measures of a data frame to alert threshold based on the alert operator.
+        Return a boolean series which is True for records where at least one measure must trigger an alert.
+        """
+        alert_function = self.get_alert_function(alert_operator)
+        alert = alert_function(measure_data.values.astype(float), float(alert_threshold))
+        return pandas.Series(alert.any(axis=1), index=measure_data.index)
+
+    def evaluate_data_frame_chunks(self, chunks: Iterable, evaluate_function: Callable[..., pandas.DataFrame], session_id: int = None):
+        """
+        Evaluate data chunk by chunk with the evaluate function of an indicator, a chunk being a data frame or a partition of data frames.
+        Return the number of records, the number of records in alert and a data frame containing only records in alert.
+        If a session Id is provided, records of each chunk are stored in session result details.
+        """
+        nb_records = 0
+        nb_records_alert = 0
+        alert_data = []
+        for chunk in chunks:
+            result_data = evaluate_function(chunk)
+            if session_id is not None:
+                self.store_result_detail(session_id, result_data)
+            nb_records += len(result_data)
+            result_data = result_data.loc[result_data['Alert']]
+            nb_records_alert += len(result_data)
+            alert_data.append(result_data)
+
+        alert_data = pandas.concat(alert_data, ignore_index=True)
+        return nb_records, nb_records_alert, alert_data
 
-    def compute_session_result(self, session_id: int, alert_operator: str, alert_threshold: str, result_data: pandas.DataFrame):
-        """Compute aggregated results for the indicator session."""
+    def compute_session_result(self, session_id: int, alert_operator: str, alert_threshold: str, result_data: pandas.DataFrame, mutation_buffer: utils.MutationBuffer = None):
+        """Compute aggregated results for the indicator session. If a mutation buffer is provided, results are sent when the buffer is flushed."""
         log.info('Compute session results.')
         nb_records = len(result_data)
         nb_records_alert = len(result_data.loc[result_data['Alert'] == True]) # pylint: disable=C0121
-        nb_records_no_alert = len(result_data.loc[result_data['Alert'] == False]) # pylint: disable=C0121
-
-        # Post results to database
-        mutation = '''mutation{createSessionResult(input:{sessionResult:{
-        alertOperator:"alert_operator",alertThreshold:alert_threshold,nbRecords:nb_records,
-        nbRecordsAlert:nb_records_alert,nbRecordsNoAlert:nb_records_no_alert,userGroup:"test_group",sessionId:session_id}}){sessionResult{id}}}'''
-
-        # Use replace() instead of format() because of curly braces
-        mutation = mutation.replace('alert_operator', alert_operator)
-        mutation = mutation.replace('alert_threshold', str(alert_threshold))
-        mutation = mutation.replace('nb_records_no_alert', str(nb_records_no_alert))  # Order matters to avoid replacing other strings nb_records
-        mutation = mutation.replace('nb_records_alert', str(nb_records_alert))  # Order matters to avoid replacing other strings nb_records
-        mutation = mutation.replace('nb_records', str(nb_records))  # Order matters to avoid replacing other strings nb_records
-        mutation = mutation.replace('session_id', str(session_id))
-        utils.execute_graphql_request(mutation)
+        self.create_session_result(session_id, alert_operator, alert_threshold, nb_records, nb_records_alert, mutation_buffer)
+        self.store_result_detail(session_id, result_data)
 
         return nb_records_alert
 
+    def create_session_result(self, session_id: int, alert_operator: str, alert_threshold: str, nb_records: int, nb_records_alert: int, mutation_buffer: utils.MutationBuffer = None):
+        """Post aggregated results of the indicator session to the database. If a mutation buffer is provided, results are sent when the buffer is flushed."""
+        session_result = {
+            'alertOperator': alert_operator,
+            'alertThreshold': float(alert_threshold),
+            'nbRecords': nb_records,
+            'nbRecordsAlert': nb_records_alert,
+            'nbRecordsNoAlert': nb_records - nb_records_alert,
+            'sessionId': session_id
+        }
+        if mutation_buffer:
+            mutation_buffer.add('createSessionResult', 'CreateSessionResultInput', {'sessionResult': session_result}, 'sessionResult{id}')
+        else:
+            mutation = 'mutation createSessionResult($sessionResult:SessionResultInput!){createSessionResult(input:{sessionResult:$sessionResult}){sessionResult{id}}}'
+            utils.execute_graphql_request(mutation, {'sessionResult': session_result})
+
+    def store_result_detail(self, session_id: int, result_data: pandas.DataFrame):
+        """
+        Bulk load records of the indicator session in table session_result_detail according to parameter result_detail:
+        none does not store records, alert stores records in alert, all stores all records. Return the number of records stored.
+        """
+        result_detail = utils.get_parameter('indicator', 'result_detail')
+        if result_detail == 'none':
+            return 0
+        if result_detail == 'alert':
+            result_data = result_data.loc[result_data['Alert']]
+        elif result_detail != 'all':
+            error_message = f'Invalid result detail parameter {result_detail}.'
+            log.error(error_message)
+            raise ValueError(error_message)
+
+        if result_data.empty:
+            return 0
+
+        # Records are stored as JSON documents along with their alert flag
+        log.info('Store %i record(s) of session results.', len(result_data))
+        alerts = result_data['Alert'].values
+        records = result_data.drop(columns='Alert')
+        copy_statement = 'COPY base.session_result_detail (session_id, alert, record) FROM STDIN WITH (FORMAT csv)'
+        connection = utils.get_database_connection()
+        try:
+            with connection, connection.cursor() as cursor:
+                for start in range(0, len(records), RESULT_DETAIL_BATCH_SIZE):
+                    end = start + RESULT_DETAIL_BATCH_SIZE
+                    json_records = records.iloc[start:end].to_json(orient='records', lines=True, date_format='iso').split('\n')
+                    csv_buffer = io.StringIO()
+                    csv_writer = csv.writer(csv_buffer)
+                    for alert, json_record in zip(alerts[start:end], json_records):
+                        csv_writer.writerow([session_id, 't' if alert else 'f', json_record])
+                    csv_buffer.seek(0)
+                    cursor.copy_expert(copy_statement, csv_buffer)
+        finally:
+            connection.close()
+
+        return len(result_data)
+
+    def get_state_hash(self, config: IndicatorConfig):
+        """Return a hash of the parameters the state of an incremental indicator depends on, used to reset the state when they change."""
+        parameters = (config.target, config.target_request, config.dimensions, config.measures,
+                      config.alert_operator, config.alert_threshold, config.watermark)
+        return hashlib.sha256(repr(parameters).encode('utf-8')).hexdigest()
+
+    def get_indicator_state(self, indicator_id: int, state_hash: str):
+        """
+        Get the state persisted by the last successful session of an incremental indicator: watermark, number of records,
+        number of records in alert and records to be merged with new records. Return an empty state if there is none or if parameters changed.
+        """
+        state = {'watermark': None, 'nb_records': 0, 'nb_records_alert': 0, 'data': None}
+        connection = utils.get_database_connection()
+        try:
+            with connection, connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT watermark, nb_records, nb_records_alert, data, state_hash FROM base.indicator_state WHERE indicator_id = %s;', (indicator_id,))
+                row = cursor.fetchone()
+        finally:
+            connection.close()
+
+        if row is None:
+            log.info('No state found for indicator Id %i, evaluate all records.', indicator_id)
+        elif row[4] != state_hash:
+            log.info('Parameters of indicator Id %i changed since its last session, reset its state.', indicator_id)
+        else:
+            state['watermark'] = decode_watermark(row[0])
+            state['nb_records'] = row[1]
+            state['nb_records_alert'] = row[2]
+            if row[3] is not None:
+                state['data'] = pandas.DataFrame(row[3]['data'], columns=row[3]['columns'])
+
+        return state
+
+    def save_indicator_state(self, indicator_id: int, state_hash: str, watermark: object, nb_records: int, nb_records_alert: int, data: pandas.DataFrame = None):
+        """Persist the state of an incremental indicator once its session has been evaluated successfully."""
+        log.info('Save state of indicator Id %i with watermark %s.', indicator_id, watermark)
+        if data is not None:
+            data = data.to_json(orient='split', date_unit='us')
+        statement = (
+            'INSERT INTO base.indicator_state (watermark, nb_records, nb_records_alert, data, state_hash, indicator_id, user_group_id) '
+            'SELECT %s, %s, %s, %s, %s, id, user_group_id FROM base.indicator WHERE id = %s '
+            'ON CONFLICT (indicator_id) DO UPDATE SET watermark = EXCLUDED.watermark, nb_records = EXCLUDED.nb_records, '
+            'nb_records_alert = EXCLUDED.nb_records_alert, data = EXCLUDED.data, state_hash = EXCLUDED.state_hash;')
+        connection = utils.get_database_connection()
+        try:
+            with connection, connection.cursor() as cursor:
+                cursor.execute(statement, (json.dumps(encode_watermark(watermark)), nb_records, nb_records_alert, data, state_hash, indicator_id))
+        finally:
+            connection.close()
+
     def send_alert(self, indicator_id: int, indicator_name: str, session_id: int, distribution_list: List[str], alert_operator: str, alert_threshold: str, nb_records_alert: str, result_data: pandas.DataFrame):
         """Build the alert e-mail to be sent for the session."""
-        # Create csv file to send in attachment
-        file_name = f'indicator_{indicator_id}_session_{session_id}.csv'
-        file_path = os.path.dirname(__file__) + "/" + file_name
-        result_data.to_csv(file_path, header=True, index=False)
+        # Create compressed csv file in memory to send in attachment
+        attachment, nb_records_attached = self.get_alert_attachment(indicator_id, session_id, result_data)
 
         # Prepare e-mail body
         body = {}
         body['indicator_name'] = indicator_name
         body['alert_threshold'] = alert_operator + alert_threshold
         body['nb_records_alert'] = nb_records_alert
+        body['nb_records_attached'] = nb_records_attached
         body['log_url'] = 'http://'  # To be updated
 
         # Send e-mail
         log.info('Send e-mail alert.')
-        utils.send_mail(session_id, distribution_list, 'indicator', file_path, **body)
-        os.remove(file_path)
+        utils.send_alert(session_id, distribution_list, attachment, **body)
 
         return True
+
+    def get_alert_attachment(self, indicator_id: int, session_id: int, result_data: pandas.DataFrame):
+        """
+        Write results of the session to a gzip compressed csv file in memory, limited to records in alert unless parameter attachment_records is all.
+        Return a tuple of file name and file content along with the number of records attached.
+        """
+        if utils.get_parameter('indicator', 'attachment_records') != 'all':
+            result_data = result_data.loc[result_data['Alert']]
+
+        # Limit number of records attached to the e-mail
+        attachment_max_records = int(utils.get_parameter('indicator', 'attachment_max_records'))
+        if attachment_max_records and len(result_data) > attachment_max_records:
+            log.info('Attach first %i records out of %i.', attachment_max_records, len(result_data))
+            result_data = result_data.head(attachment_max_records)
+
+        file_name = f'indicator_{indicator_id}_session_{session_id}.csv'
+        buffer = io.BytesIO()
+        with gzip.GzipFile(filename=file_name, mode='wb', fileobj=buffer) as gzip_file:
+            csv_file = io.TextIOWrapper(gzip_file, encoding='utf-8', newline='')
+            result_data.to_csv(csv_file, header=True, index=False)
+            csv_file.flush()
+            csv_file.detach()  # Prevent closing gzip file before its trailer is written
+
+        return (file_name + '.gz', buffer.getvalue()), len(result_data)
@@ -1,8 +1,11 @@
 """Manage class and methods for data latency indicators."""
 import logging
+import tempfile
 import pandas
-from indicator import Indicator
+from indicator import DEFAULT_SPILL_CHUNK_SIZE, Indicator
 from session import update_session_status
+from utils import MutationBuffer
+import utils
 
 # Load logging configuration
 log = logging.getLogger(__name__)
@@ -14,8 +17,11 @@ class Latency(Indicator):
     def __init__(self):
         pass
 
-    def execute(self, session: dict):
+    def execute(self, session: dict, mutation_buffer: MutationBuffer = None):
         """Execute indicator of type latency."""
+        if mutation_buffer is None:
+            mutation_buffer = MutationBuffer()
+
         # Update session status to running
         session_id: int = session['id']
         indicator_id: int = session['indicatorId']
@@ -26,38 +32,61 @@ class Latency(Indicator):
         # Verify if the list of indicator parameters is valid
         indicator_type_id = session['indicatorByIndicatorId']['indicatorTypeId']
         parameters = session['indicatorByIndicatorId']['parametersByIndicatorId']['nodes']
-        parameters = super().verify_indicator_parameters(indicator_type_id, parameters)
-
-        # Get source data
-        dimensions = parameters[4]
-        measures = parameters[5]
-        source = parameters[6]
-        source_request = parameters[7]
-        source_data = super().get_data_frame(source, source_request, dimensions, measures)
-
-        # Get target data
-        target = parameters[8]
-        target_request = parameters[9]
-        target_data = super().get_data_frame(target, target_request, dimensions, measures)
-
-        # Evaluate latency
-        alert_operator = parameters[1]  # Alert operator
-        alert_threshold = parameters[2]  # Alert threshold
-        log.info('Evaluate latency of target data source.')
-        result_data = self.evaluate_latency(source_data, target_data, dimensions, measures, alert_operator, alert_threshold)
-
-        # Compute session result
-        nb_records_alert = super().compute_session_result(session_id, alert_operator, alert_threshold, result_data)
+        config = super().get_indicator_config(indicator_type_id, parameters)
+
+        # Get source and target data concurrently and evaluate latency
+        dimensions = config.dimensions
+        measures = config.measures
+        source = config.source
+        source_request = config.source_request
+        target = config.target
+        target_request = config.target_request
+        alert_operator = config.alert_operator
+        alert_threshold = config.alert_threshold
+        spill_partitions = int(utils.get_parameter('indicator', 'spill_partitions'))
+
+        if spill_partitions > 0:
+            # Spill source and target data to partition files on disk and compare them partition by partition
+            chunk_size = int(utils.get_parameter('indicator', 'chunk_size')) or DEFAULT_SPILL_CHUNK_SIZE
+            with tempfile.TemporaryDirectory() as directory:
+                super().spill_data_frames(
+                    directory, spill_partitions, chunk_size,
+                    (source, source_request, dimensions, measures),
+                    (target, target_request, dimensions, measures))
+
+                log.info('Evaluate latency of target data source by partitions.')
+                partitions = super().read_partitions(directory, spill_partitions)
+                nb_records, nb_records_alert, result_data = super().evaluate_data_frame_chunks(
+                    partitions, lambda partition: self.evaluate_latency(*partition, dimensions, measures, alert_operator, alert_threshold), session_id)
+            result_data = result_data.sort_values(dimensions).reset_index(drop=True)
+
+            # Compute session result
+            super().create_session_result(
+                session_id, alert_operator, alert_threshold, nb_records, nb_records_alert, mutation_buffer)
+
+        else:
+            source_data, target_data = super().get_data_frames(
+                (source, source_request, dimensions, measures),
+                (target, target_request, dimensions, measures))
+
+            log.info('Evaluate latency of target data source.')
+            result_data = self.evaluate_latency(
+                source_data, target_data, dimensions, measures, alert_operator, alert_threshold)
+
+            # Compute session result
+            nb_records_alert = super().compute_session_result(
+                session_id, alert_operator, alert_threshold, result_data, mutation_buffer)
 
         # Send e-mail alert
         if nb_records_alert != 0:
             indicator_name = session['indicatorByIndicatorId']['name']
-            distribution_list = parameters[3]  # Distribution list
+            distribution_list = config.distribution_list
             super().send_alert(indicator_id, indicator_name, session_id, distribution_list, alert_operator, alert_threshold, nb_records_alert, result_data)
 
-        # Update session status to succeeded
+        # Update session status to succeeded along with session results
         log.debug('Update session status to Succeeded.')
-        update_session_status(session_id, 'Succeeded')
+        update_session_status(session_id, 'Succeeded', mutation_buffer)
+        mutation_buffer.flush()
         log.info('Session Id %i for indicator Id %i completed successfully.', session_id, indicator_id)
 
     def evaluate_latency(self,
@@ -94,12 +123,8 @@ class Latency(Indicator):
             result_data[delta_column] = round(delta_seconds/60).astype(int)
             result_data[delta_description_column] = pandas.to_timedelta(delta_seconds, unit='s')
 
-        # For each record and measure in data frame test if alert must be sent and update alert column
-        result_data['Alert'] = False
-        for measure in measures:
-            for row_num in result_data.index:
-                measure_value = result_data.loc[row_num, measure + '_delta_minutes']
-                if self.is_alert(measure_value, alert_operator, alert_threshold):
-                    result_data.loc[row_num, 'Alert'] = True
+        # Test if alert must be sent for each record
+        delta_columns = [measure + '_delta_minutes' for measure in measures]
+        result_data['Alert'] = self.evaluate_alert(result_data[delta_columns], alert_operator, alert_threshold)
 
         return result_data
@@ -4,6 +4,7 @@ import logging
 import sys
 from batch import Batch
 from data_source import DataSource
+from worker import Worker
 
 
 log = logging.getLogger(__name__)
@@ -16,21 +17,35 @@ logging.basicConfig(
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Entry point to execute data quality scripts.')
-    parser.add_argument('method', type=str, help='Method to be executed: execute_batch, test_data_source')
-    parser.add_argument('id', type=int, help='Id of the object on which to execute the method.')
+    parser.add_argument('method', type=str, help='Method to be executed: execute_batch, test_data_source, test_data_sources, worker')
+    parser.add_argument('id', type=str, nargs='*', help='Id of the object on which to execute the method, list of Ids or all for test_data_sources, not used by worker.')
     arguments = parser.parse_args()
 
     method = arguments.method
+    if method in ['execute_batch', 'test_data_source'] and len(arguments.id) != 1:
+        parser.error(f'Method {method} requires exactly one id.')
+    if method == 'test_data_sources' and not arguments.id:
+        parser.error(f'Method {method} requires a list of ids or all.')
+
     if method == 'execute_batch':
-        batch_id = arguments.id
+        batch_id = int(arguments.id[0])
         batch = Batch()
         batch.execute(batch_id)
 
     elif method == 'test_data_source':
-        data_source_id = arguments.id
+        data_source_id = int(arguments.id[0])
         data_source = DataSource()
         data_source.test(data_source_id)
 
+    elif method == 'test_data_sources':
+        data_source_ids = None if arguments.id == ['all'] else [int(data_source_id) for data_source_id in arguments.id]
+        data_source = DataSource()
+        data_source.test_many(data_source_ids)
+
+    elif method == 'worker':
+        worker = Worker()
+        worker.run()
+
     else:
         error_message = f'Invalid method {method}'
         log.error(error_message)
@@ -6,11 +6,25 @@ import utils
 log = logging.getLogger(__name__)
 
 
-def update_session_status(session_id: int, session_status: str):
-    """Update a session status."""
-    mutation = 'mutation{updateSessionById(input:{id:session_id,sessionPatch:{status:"session_status"}}){session{status}}}'
-    mutation = mutation.replace('session_id', str(session_id))  # Use replace() instead of format() because of curly braces
-    # Use replace() instead of format() because of curly braces
-    mutation = mutation.replace('session_status', str(session_status))
-    data = utils.execute_graphql_request(mutation)
+def update_session_status(session_id: int, session_status: str, mutation_buffer: utils.MutationBuffer = None):
+    """Update a session status. If a mutation buffer is provided, the update is sent when the buffer is flushed."""
+    if mutation_buffer:
+        mutation_input = {'id': session_id, 'sessionPatch': {'status': session_status}}
+        mutation_buffer.add('updateSessionById', 'UpdateSessionByIdInput', mutation_input, 'session{status}')
+        return None
+
+    mutation = 'mutation updateSessionStatus($id:Int!,$status:String!){updateSessionById(input:{id:$id,sessionPatch:{status:$status}}){session{status}}}'
+    variables = {'id': session_id, 'status': session_status}
+    data = utils.execute_graphql_request(mutation, variables)
     return data
+
+
+def delete_session_result_detail(session_id: int):
+    """Delete the records stored in table session_result_detail by a session, used when the session fails."""
+    connection = utils.get_database_connection()
+    try:
+        with connection, connection.cursor() as cursor:
+            cursor.execute('DELETE FROM base.session_result_detail WHERE session_id = %s;', (session_id,))
+            return cursor.rowcount
+    finally:
+        connection.close()
@@ -3,22 +3,36 @@ from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from functools import lru_cache, partial
 import configparser
 import logging
 import os
+import queue
 import smtplib
+import threading
+import time
+from typing import Callable, List, Tuple
 from jinja2 import Template
+import psycopg2
 import requests
+from requests.adapters import HTTPAdapter
 
 # Load logging configuration
 log = logging.getLogger(__name__)
 
 
-def get_parameter(section: str, parameter_name: str = None):
-    """Get parameters from flat file config.cfg."""
+@lru_cache(maxsize=None)
+def get_configuration():
+    """Load flat file scripts.cfg once per process."""
     configuration = configparser.ConfigParser()
     path = os.path.dirname(__file__)
     configuration.read(path + '/scripts.cfg')
+    return configuration
+
+
+def get_parameter(section: str, parameter_name: str = None):
+    """Get parameters from flat file scripts.cfg."""
+    configuration = get_configuration()
     if parameter_name:
         parameters = configuration[section][parameter_name]
     else:
@@ -29,17 +43,294 @@ def get_parameter(section: str, parameter_name: str = None):
     return parameters
 
 
-def execute_graphql_request(payload: object):
+def get_database_connection():
+    """Open a connection to the MobyDQ database, used for operations which cannot go through the GraphQL API such as bulk loading."""
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+
+class GraphQLClient:
+    """Client used to execute queries and mutations on the GraphQL API through a pooled keep-alive HTTP session."""
+
+    def __init__(self):
+        self.url = get_parameter('graphql', 'url')
+        self.process_id = os.getpid()
+        self.session = requests.Session()
+        pool_size = max(int(get_parameter('batch', 'concurrency')), requests.adapters.DEFAULT_POOLSIZE)
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=pool_size))
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=pool_size))
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.request_time = 0.0
+
+    def execute(self, payload: str, variables: dict = None):
+        """Execute a query or mutation with its variables and return the response data."""
+        start_time = time.perf_counter()
+        response = self.session.post(self.url, json={'query': payload, 'variables': variables})
+        data = response.json()
+        request_time = time.perf_counter() - start_time
+
+        with self.lock:
+            self.request_count += 1
+            self.request_time += request_time
+
+        return data
+
+    def get_statistics(self):
+        """Return the number of requests executed and their cumulated latency in seconds."""
+        with self.lock:
+            return {'request_count': self.request_count, 'request_time': self.request_time}
+
+
+GRAPHQL_CLIENT_LOCK = threading.Lock()
+GRAPHQL_CLIENT = None
+
+
+def get_graphql_client():
+    """Return the GraphQL client of the current process."""
+    global GRAPHQL_CLIENT  # pylint: disable=global-statement
+    with GRAPHQL_CLIENT_LOCK:
+        # Do not share HTTP connections with forked worker processes
+        if GRAPHQL_CLIENT is None or GRAPHQL_CLIENT.process_id != os.getpid():
+            GRAPHQL_CLIENT = GraphQLClient()
+        return GRAPHQL_CLIENT
+
+
+def execute_graphql_request(payload: str, variables: dict = None):
     """Execute queries and mutations on the GraphQL API."""
-    url = get_parameter('graphql', 'url')
-    headers = {'Content-Type': 'application/graphql'}
-    response = requests.post(url, headers=headers, data=payload)
-    data = response.json()
-    return data
+    return get_graphql_client().execute(payload, variables)
+
+
+class MutationBuffer:
+    """Buffer of mutations sent to the GraphQL API in a single aliased document when flushed."""
+
+    def __init__(self):
+        self.mutations = []
+
+    def add(self, mutation_name: str, input_type: str, mutation_input: dict, selection: str):
+        """Add a mutation to the buffer, for instance add('updateSessionById', 'UpdateSessionByIdInput', {...}, 'session{status}')."""
+        self.mutations.append((mutation_name, input_type, mutation_input, selection))
+
+    def flush(self):
+        """Execute all buffered mutations in one request. Return the result of each mutation in the order they were added."""
+        if not self.mutations:
+            return []
+
+        # Alias each mutation and pass its input as a variable
+        mutations = self.mutations
+        self.mutations = []
+        variable_definitions = []
+        fields = []
+        variables = {}
+        for index, (mutation_name, input_type, mutation_input, selection) in enumerate(mutations):
+            variable_definitions.append(f'$input{index}:{input_type}!')
+            fields.append(f'mutation{index}:{mutation_name}(input:$input{index}){{{selection}}}')
+            variables[f'input{index}'] = mutation_input
+
+        variable_definitions = ','.join(variable_definitions)
+        fields = ','.join(fields)
+        mutation = f'mutation flushMutations({variable_definitions}){{{fields}}}'
+        data = execute_graphql_request(mutation, variables)
+
+        if data.get('errors'):
+            error_message = f'Buffered mutations failed: {data["errors"]}'
+            log.error(error_message)
+            raise Exception(error_message)
+
+        return [data['data'][f'mutation{index}'] for index in range(len(mutations))]
+
+
+@lru_cache(maxsize=None)
+def get_template(template: str):
+    """Load and compile an e-mail template once per process."""
+    with open(os.path.dirname(__file__) + f'/email/{template}.html', 'r') as html:
+        return Template(html.read())
+
+
+def connect_smtp(config: dict):
+    """Connect to the smtp server. Return a connection object."""
+    connection = smtplib.SMTP(config['host'], config['port'], timeout=float(config['timeout']))
+
+    # If smtp server is Gmail activate encryption and authenticate user
+    if config['host'] == 'smtp.gmail.com':
+        connection.ehlo()
+        connection.starttls()
+        connection.login(config['sender'], config['password'])
+
+    return connection
+
+
+class MailSession:  # pylint: disable=too-many-instance-attributes
+    """Smtp connection, queue of notifications and digest of alerts shared by the sessions of a batch."""
+
+    def __init__(self, is_digest: bool, queue_size: int = 100, retries: int = 3):
+        self.process_id = os.getpid()
+        self.is_digest = is_digest
+        self.lock = threading.Lock()  # Protects digests and statistics
+        self.connection_lock = threading.Lock()  # Protects the smtp connection, held during network calls
+        self.connection = None
+        self.digests = {}  # Distribution list: list of (e-mail body parameters, attachment)
+        self.retries = retries  # Number of retries of a notification after its first attempt
+        self.notifications = queue.Queue(maxsize=queue_size)
+        self.statistics = {'sent': 0, 'failed': 0, 'retries': 0, 'pending': 0}
+        self.is_stopped = threading.Event()  # Set when notifications could not be delivered before the flush timeout
+        self.thread = threading.Thread(target=self.deliver_notifications, daemon=True)
+        self.thread.start()
+
+    def enqueue(self, session_id: int, description: str, send_function: Callable[[], bool]):
+        """Hand off a notification to the background thread, block if the queue is full."""
+        self.notifications.put((session_id, description, send_function))
+
+    def deliver_notifications(self):
+        """Send queued notifications until the queue is closed, retrying failed notifications with exponential backoff."""
+        while not self.is_stopped.is_set():
+            notification = self.notifications.get()
+            if notification is None:
+                break
+
+            session_id, description, send_function = notification
+            if session_id is not None:
+                description = f'{description} of session Id {session_id}'
+            for attempt in range(self.retries + 1):
+                try:
+                    send_function()
+                    log.info('Notification %s sent.', description)
+                    self.count('sent')
+                    break
+                except Exception:  # pylint: disable=broad-except
+                    if attempt == self.retries:
+                        log.exception('Notification %s failed after %i attempt(s).', description, attempt + 1)
+                        self.count('failed')
+                    elif self.is_stopped.is_set():
+                        log.exception('Notification %s failed, flush timeout reached.', description)
+                        self.count('failed')
+                        break
+                    else:
+                        log.warning('Notification %s failed, retry in %i second(s).', description, 2 ** attempt)
+                        self.count('retries')
+                        self.is_stopped.wait(2 ** attempt)
+
+    def count(self, statistic: str, value: int = 1):
+        """Increment a delivery statistic, statistics are updated by the background thread and the caller."""
+        with self.lock:
+            self.statistics[statistic] += value
+
+    def flush(self, timeout: float):
+        """Wait for queued notifications to be delivered until timeout. Return delivery statistics."""
+        deadline = time.monotonic() + timeout
+        try:
+            # Do not wait beyond the timeout if the queue is full
+            self.notifications.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(max(0, deadline - time.monotonic()))
+        if self.thread.is_alive():
+            # Stop the background thread after the notification being sent, remaining notifications are not sent
+            self.is_stopped.set()
+            with self.notifications.mutex:
+                pending = len([notification for notification in self.notifications.queue if notification is not None])
+            self.count('pending', pending)
+            log.error('Notifications could not all be delivered within %i seconds.', timeout)
+        with self.lock:
+            return dict(self.statistics)
+
+    def send(self, sender: str, recipients: str, message: str):
+        """Send an e-mail through the connection of the batch, reconnecting if the smtp server closed it."""
+        with self.connection_lock:
+            for attempt in range(2):
+                if self.connection is None:
+                    self.connection = connect_smtp(get_parameter('mail'))
+                try:
+                    self.connection.sendmail(sender, recipients, message)
+                    break
+                except smtplib.SMTPServerDisconnected:
+                    self.connection = None
+                    if attempt:
+                        raise
+        return True
+
+    def add_alert(self, distribution_list: List[str], attachment: Tuple[str, bytes], **kwargs):
+        """Add an alert to the digest of its distribution list."""
+        with self.lock:
+            self.digests.setdefault(tuple(sorted(distribution_list)), []).append((kwargs, attachment))
+
+    def close(self, timeout: float):
+        """
+        Queue one digest e-mail per distribution list, deliver queued notifications within timeout and close the smtp connection.
+        Return delivery statistics.
+        """
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            digests = self.digests
+            self.digests = {}
+        for distribution_list, alerts in digests.items():
+            log.info('Queue digest e-mail of %i alert(s).', len(alerts))
+            attachments = [attachment for _, attachment in alerts if attachment]
+            send_function = partial(send_mail, None, list(distribution_list), 'digest', attachments, alerts=[body for body, _ in alerts])
+            try:
+                # Digests are retried like other notifications, do not wait beyond the timeout if the queue is full
+                self.notifications.put((None, f'digest of {len(alerts)} alert(s)', send_function), timeout=max(0, deadline - time.monotonic()))
+            except queue.Full:
+                log.error('Digest e-mail of %i alert(s) could not be queued within %i seconds.', len(alerts), timeout)
+                self.count('failed')
+
+        statistics = self.flush(max(0, deadline - time.monotonic()))
+
+        # Do not wait for the background thread beyond the timeout if it is still sending a notification
+        if self.connection_lock.acquire(timeout=max(0, deadline - time.monotonic())):
+            try:
+                self.close_connection(time.monotonic() < deadline)
+            finally:
+                self.connection_lock.release()
+        else:
+            log.warning('Smtp connection is still used by a notification, it is not closed.')
+
+        return statistics
+
+    def close_connection(self, is_quit: bool):
+        """Close the smtp connection, quitting the smtp session only if is_quit is True to avoid waiting for the smtp server."""
+        if self.connection is not None:
+            try:
+                if is_quit:
+                    self.connection.quit()
+                else:
+                    self.connection.close()
+            except (OSError, smtplib.SMTPException):
+                pass
+            self.connection = None
+
+
+MAIL_SESSION = None
 
 
-def send_mail(session_id: int, distribution_list: list, template: str = None, attachment: any = None, **kwargs):
-    """Send e-mail to the distribution list."""
+def open_mail_session():
+    """Open the mail session used by a batch, alerts are grouped per distribution list if parameter digest is enabled."""
+    global MAIL_SESSION  # pylint: disable=global-statement
+    is_digest = bool(int(get_parameter('mail', 'digest')))
+    queue_size = int(get_parameter('mail', 'queue_size'))
+    retries = int(get_parameter('mail', 'retries'))
+    MAIL_SESSION = MailSession(is_digest, queue_size, retries)
+
+
+def close_mail_session():
+    """Deliver notifications, send digests and close the mail session used by a batch. Return delivery statistics."""
+    global MAIL_SESSION  # pylint: disable=global-statement
+    statistics = None
+    if MAIL_SESSION:
+        statistics = MAIL_SESSION.close(float(get_parameter('mail', 'flush_timeout')))
+        MAIL_SESSION = None
+    return statistics
+
+
+def get_mail_session():
+    """Return the mail session of the batch, None if there is no mail session in the current process."""
+    mail_session = MAIL_SESSION
+    if mail_session and mail_session.process_id == os.getpid():
+        return mail_session
+    return None
+
+
+def send_mail(session_id: int, distribution_list: list, template: str = None, attachment: Tuple[str, bytes] = None, **kwargs):
+    """Send e-mail to the distribution list. Attachment is a tuple of file name and file content, or a list of such tuples."""
     # Verify e-mail configuration
     config = get_parameter('mail')
     for key, value in config.items():
@@ -57,54 +348,64 @@ def send_mail(session_id: int, distribution_list: list, template: str = None, at
     if template == 'indicator':
         indicator_name = kwargs['indicator_name']
         email['Subject'] = f'Data quality alert: {indicator_name}'
-        html = open(os.path.dirname(__file__) + f'/email/{template}.html', 'r')
-        body = html.read()
-        body = Template(body)
-        body = body.render(**kwargs)
+        body = get_template(template).render(**kwargs)
 
     elif template == 'error':
         indicator_name = kwargs['indicator_name']
         email['Subject'] = f'Data quality error: {indicator_name}'
-        html = open(os.path.dirname(__file__) + f'/email/{template}.html', 'r')
-        body = html.read()
-        body = Template(body)
         kwargs['session_id'] = session_id
-        body = body.render(**kwargs)
+        body = get_template(template).render(**kwargs)
+
+    elif template == 'digest':
+        nb_alerts = len(kwargs['alerts'])
+        email['Subject'] = f'Data quality alerts: {nb_alerts} indicator(s)'
+        body = get_template(template).render(**kwargs)
 
     else:
         email['Subject'] = 'Data quality notification'
-        html = open(os.path.dirname(__file__) + '/email/default.html', 'r')
-        body = html.read()
-        body = Template(body)
-        body = body.render(**kwargs)
+        body = get_template('default').render(**kwargs)
 
     # Attache body to e-mail
     body = MIMEText(body, 'html')
     email.attach(body)
 
-    # Add attachment to e-mail
-    if attachment:
-        attachment_path = os.path.join(os.path.dirname(__file__), attachment)
+    # Add attachments to e-mail
+    attachments = attachment if isinstance(attachment, list) else [attachment]
+    for file_name, content in filter(None, attachments):
         part = MIMEBase('application', 'octet-stream')
-        part.set_payload(open(attachment_path, 'rb').read())
+        part.set_payload(content)
         encoders.encode_base64(part)
-        part.add_header('Content-Disposition', f'attachment; filename="{os.path.basename(attachment_path)}"')
+        part.add_header('Content-Disposition', f'attachment; filename="{file_name}"')
         email.attach(part)
 
-    # Connect to smtp server
-    connection = smtplib.SMTP(config['host'], config['port'])
+    # Send email through the connection of the batch if any, otherwise through a dedicated connection
+    mail_session = get_mail_session()
+    if mail_session:
+        mail_session.send(email['From'], email['To'], email.as_string())
+    else:
+        connection = connect_smtp(config)
+        connection.sendmail(email['From'], email['To'], email.as_string())
+        connection.quit()
 
-    # If smtp server is Gmail activate encryption and authenticate user
-    if config['host'] == 'smtp.gmail.com':
-        connection.ehlo()
-        connection.starttls()
-        connection.login(config['sender'], config['password'])
+    return True
 
-    # Send email
-    connection.sendmail(email['From'], email['To'], email.as_string())
-    connection.quit()
 
-    return True
+def send_alert(session_id: int, distribution_list: list, attachment: Tuple[str, bytes] = None, **kwargs):
+    """
+    Send alert e-mail to the distribution list. Within a batch, the alert is added to the digest if digest is enabled,
+    otherwise it is sent in background.
+    """
+    mail_session = get_mail_session()
+    if mail_session and mail_session.is_digest:
+        mail_session.add_alert(distribution_list, attachment, **kwargs)
+        return True
+
+    if mail_session:
+        send_function = partial(send_mail, session_id, distribution_list, 'indicator', attachment, **kwargs)
+        mail_session.enqueue(session_id, 'alert', send_function)
+        return True
+
+    return send_mail(session_id, distribution_list, 'indicator', attachment, **kwargs)
 
 
 def send_error(indicator_id: int, indicator_name: str, session_id: int, distribution_list: list, error_message: str):
@@ -115,8 +416,12 @@ def send_error(indicator_id: int, indicator_name: str, session_id: int, distribu
     body['indicator_name'] = indicator_name
     body['error_message'] = error_message
 
-    # Send e-mail
+    # Send e-mail, in background within a batch
     log.info('Send error e-mail.')
-    send_mail(session_id, distribution_list, 'error', None, **body)
+    mail_session = get_mail_session()
+    if mail_session:
+        mail_session.enqueue(session_id, 'error', partial(send_mail, session_id, distribution_list, 'error', None, **body))
+    else:
+        send_mail(session_id, distribution_list, 'error', None, **body)
 
     return True
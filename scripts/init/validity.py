@@ -1,8 +1,10 @@
 """Manage class and methods for data validity indicators."""
 import logging
 import pandas
-from indicator import Indicator
+from indicator import Indicator, IndicatorConfig
 from session import update_session_status
+from utils import MutationBuffer
+import utils
 
 # Load logging configuration
 log = logging.getLogger(__name__)
@@ -14,8 +16,11 @@ class Validity(Indicator):
     def __init__(self):
         pass
 
-    def execute(self, session: dict):
+    def execute(self, session: dict, mutation_buffer: MutationBuffer = None):
         """Execute indicator of type validity."""
+        if mutation_buffer is None:
+            mutation_buffer = MutationBuffer()
+
         # Update session status to running
         session_id = session['id']
         indicator_id = session['indicatorId']
@@ -26,54 +31,95 @@ class Validity(Indicator):
         # Verify if the list of indicator parameters is valid
         indicator_type_id = session['indicatorByIndicatorId']['indicatorTypeId']
         parameters = session['indicatorByIndicatorId']['parametersByIndicatorId']['nodes']
-        parameters = super().verify_indicator_parameters(indicator_type_id, parameters)
-
-        # Get target data
-        dimensions = parameters[4]
-        measures = parameters[5]
-        target = parameters[8]
-        target_request = parameters[9]
-        target_data = super().get_data_frame(target, target_request, dimensions, measures)
-
-        # Evaluate completeness
-        alert_operator = parameters[1]  # Alert operator
-        alert_threshold = parameters[2]  # Alert threshold
-        log.info('Evaluate validity of target data source.')
-        result_data = self.evaluate_validity(
-            target_data, measures, alert_operator, alert_threshold)
+        config = super().get_indicator_config(indicator_type_id, parameters)
 
-        # Compute session result
-        nb_records_alert = super().compute_session_result(
-            session_id, alert_operator, alert_threshold, result_data)
+        # Get target data and evaluate validity
+        dimensions = config.dimensions
+        measures = config.measures
+        target = config.target
+        target_request = config.target_request
+        alert_operator = config.alert_operator
+        alert_threshold = config.alert_threshold
+        chunk_size = int(utils.get_parameter('indicator', 'chunk_size'))
+        indicator_state = None  # Arguments of save_indicator_state in incremental mode
+
+        if config.watermark:
+            # Evaluate only records above the watermark of the last successful session
+            log.info('Evaluate validity of new records of target data source.')
+            nb_records_alert, result_data, indicator_state = self.evaluate_validity_incremental(
+                session_id, indicator_id, config, mutation_buffer)
+
+        elif chunk_size > 0:
+            # Stream target data by chunks and keep only records in alert
+            log.info('Evaluate validity of target data source by chunks.')
+            target_data = super().get_data_frame_chunks(target, target_request, dimensions, measures, chunk_size)
+            nb_records, nb_records_alert, result_data = super().evaluate_data_frame_chunks(
+                target_data, lambda data_frame: self.evaluate_validity(data_frame, measures, alert_operator, alert_threshold), session_id)
+
+            # Compute session result
+            super().create_session_result(
+                session_id, alert_operator, alert_threshold, nb_records, nb_records_alert, mutation_buffer)
+
+        else:
+            target_data = super().get_data_frame(target, target_request, dimensions, measures)
+            log.info('Evaluate validity of target data source.')
+            result_data = self.evaluate_validity(
+                target_data, measures, alert_operator, alert_threshold)
 
-        # Send e-mail alert
-        if nb_records_alert != 0:
+            # Compute session result
+            nb_records_alert = super().compute_session_result(
+                session_id, alert_operator, alert_threshold, result_data, mutation_buffer)
+
+        # Send e-mail alert, in incremental mode it reports only new records in alert so that its summary matches its attachment
+        # Session result keeps the number of records in alert of all sessions since the state was reset
+        nb_records_alert_notified = len(result_data) if config.watermark else nb_records_alert
+        if nb_records_alert_notified != 0:
             indicator_name = session['indicatorByIndicatorId']['name']
-            distribution_list = parameters[3]  # Distribution list
+            distribution_list = config.distribution_list
             super().send_alert(indicator_id, indicator_name, session_id, distribution_list,
-                               alert_operator, alert_threshold, nb_records_alert, result_data)
+                               alert_operator, alert_threshold, nb_records_alert_notified, result_data)
 
-        # Update session status to succeeded
+        # Update session status to succeeded along with session results
         log.debug('Update session status to Succeeded.')
-        update_session_status(session_id, 'Succeeded')
+        update_session_status(session_id, 'Succeeded', mutation_buffer)
+        mutation_buffer.flush()
+
+        # Persist state for the next session only once session results are saved, otherwise new records would be skipped
+        if indicator_state:
+            super().save_indicator_state(*indicator_state)
         log.info('Session Id %i for indicator Id %i completed successfully.', session_id, indicator_id)
 
+    def evaluate_validity_incremental(self, session_id: int, indicator_id: int, config: IndicatorConfig, mutation_buffer: MutationBuffer):
+        """
+        Evaluate records above the watermark of the last successful session and add their results to the ones of previous sessions.
+        Return the number of records in alert of all sessions, new records in alert and the arguments of save_indicator_state.
+        """
+        state_hash = super().get_state_hash(config)
+        state = super().get_indicator_state(indicator_id, state_hash)
+        target_data, watermark = super().get_incremental_data_frame(
+            config.target, config.target_request, config.dimensions, config.measures, config.watermark, state['watermark'])
+        result_data = self.evaluate_validity(target_data, config.measures, config.alert_operator, config.alert_threshold)
+        super().store_result_detail(session_id, result_data)
+        nb_records = state['nb_records'] + len(result_data)
+        result_data = result_data.loc[result_data['Alert']]
+        nb_records_alert = state['nb_records_alert'] + len(result_data)
+
+        # Compute session result
+        super().create_session_result(
+            session_id, config.alert_operator, config.alert_threshold, nb_records, nb_records_alert, mutation_buffer)
+        return nb_records_alert, result_data, (indicator_id, state_hash, watermark, nb_records, nb_records_alert)
+
     def evaluate_validity(self, target_data: pandas.DataFrame, measures: str, alert_operator: str, alert_threshold: str):
         """Compute specificities of validity indicator and return results in a data frame."""
         # No tranformation needed for this data frame
         result_data = target_data
-        result_data = result_data.fillna(value=0)  # Replace NaN values per 0
+        result_data = result_data.fillna(value={measure: 0 for measure in measures})  # Replace NaN values per 0
 
-        # Formatting data to improve readability
+        # Formatting data to improve readability, measures are enforced to float before rounding in case they have been downcast
         for measure in measures:
-            result_data[measure] = round(result_data[measure], 2).astype(float)
+            result_data[measure] = round(result_data[measure].astype(float), 2)
 
-        # For each record and measure in data frame test if alert must be sent and update alert column
-        result_data['Alert'] = False
-        for measure in measures:
-            for row_num in result_data.index:
-                measure_value = result_data.loc[row_num, measure]
-                if self.is_alert(measure_value, alert_operator, alert_threshold):
-                    result_data.loc[row_num, 'Alert'] = True
+        # Test if alert must be sent for each record
+        result_data['Alert'] = self.evaluate_alert(result_data[measures], alert_operator, alert_threshold)
 
         return result_data
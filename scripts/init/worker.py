@@ -0,0 +1,96 @@
+"""Manage class and methods for the worker executing batches in a long-running process."""
+import logging
+import select
+import signal
+import psycopg2
+from batch import Batch
+import utils
+
+# Load logging configuration
+log = logging.getLogger(__name__)
+
+# Channel on which base.execute_batch notifies the Id of pending batches
+BATCH_CHANNEL = 'batch_pending'
+
+# Seconds to wait for a notification before checking if the worker must stop
+POLL_TIMEOUT = 5
+
+
+class Worker:
+    """Worker class listening to pending batches and executing them in-process."""
+
+    def __init__(self):
+        self.is_stopping = False
+        self.connection = None
+
+    def stop(self, signal_number: int, frame: object):  # pylint: disable=unused-argument
+        """Request the worker to stop once the batch being executed is completed."""
+        log.info('Received signal %i, worker will stop after the current batch.', signal_number)
+        self.is_stopping = True
+
+    def connect(self):
+        """Open a connection to the database and listen to notifications of pending batches."""
+        self.connection = utils.get_database_connection()
+        self.connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {BATCH_CHANNEL};')
+        log.info('Worker listening to channel %s.', BATCH_CHANNEL)
+
+    def get_pending_batches(self):
+        """Return the list of Ids of pending batches, including the ones created while the worker was not listening."""
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT id FROM base.batch WHERE status = 'Pending' ORDER BY id;")
+            return [row[0] for row in cursor.fetchall()]
+
+    def claim_batch(self, batch_id: int):
+        """Set a pending batch to running. Return True if the batch has been claimed by this worker, False otherwise."""
+        with self.connection.cursor() as cursor:
+            cursor.execute("UPDATE base.batch SET status = 'Running' WHERE id = %s AND status = 'Pending' RETURNING id;", (batch_id,))
+            return cursor.fetchone() is not None
+
+    def fail_batch(self, batch_id: int):
+        """Set a batch claimed by this worker to failed if its execution did not complete its status."""
+        with self.connection.cursor() as cursor:
+            cursor.execute("UPDATE base.batch SET status = 'Failed' WHERE id = %s AND status = 'Running';", (batch_id,))
+
+    def execute_batch(self, batch_id: int):
+        """Claim and execute a pending batch. Return True if the batch has been executed by this worker, False otherwise."""
+        if not self.claim_batch(batch_id):
+            log.debug('Batch Id %i has already been claimed.', batch_id)
+            return False
+
+        try:
+            Batch().execute(batch_id)
+        except Exception:  # pylint: disable=broad-except
+            # Claimed batch would remain Running if it fails before its status is updated, for instance if it has no session
+            log.exception('Execution of batch Id %i failed.', batch_id)
+            self.fail_batch(batch_id)
+        return True
+
+    def execute_pending_batches(self):
+        """Claim and execute pending batches one after the other."""
+        for batch_id in self.get_pending_batches():
+            if self.is_stopping:
+                break
+            self.execute_batch(batch_id)
+
+    def run(self):
+        """Execute pending batches and wait for new ones until the worker receives a termination signal."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.connect()
+
+        try:
+            self.execute_pending_batches()
+            while not self.is_stopping:
+                # Wait for notifications, the timeout allows to check regularly if the worker must stop
+                if select.select([self.connection], [], [], POLL_TIMEOUT) == ([], [], []):
+                    continue
+
+                self.connection.poll()
+                if self.connection.notifies:
+                    self.connection.notifies.clear()
+                    self.execute_pending_batches()
+        finally:
+            self.connection.close()
+            log.info('Worker stopped.')
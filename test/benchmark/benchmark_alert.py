@@ -0,0 +1,70 @@
+"""Benchmark of alert evaluation: per-record is_alert loop versus vectorized evaluate_alert.
+
+Run from the test container:
+$ python test/benchmark/benchmark_alert.py --sizes 10000 100000 1000000 10000000
+"""
+import argparse
+import time
+import numpy
+import pandas
+from scripts.indicator import Indicator
+
+
+def get_test_data(nb_records: int, nb_measures: int):
+    """Generate a data frame of random measures."""
+    random = numpy.random.RandomState(42)
+    data = random.randint(-100, 100, size=(nb_records, nb_measures)).astype(float)
+    columns = [f'measure_{i}' for i in range(nb_measures)]
+    return pandas.DataFrame(data, columns=columns)
+
+
+def evaluate_alert_loop(result_data: pandas.DataFrame, measures: list, alert_operator: str, alert_threshold: str):
+    """Former implementation testing each record and measure with is_alert and eval."""
+    result_data['Alert'] = False
+    for measure in measures:
+        for row_num in result_data.index:
+            measure_value = result_data.loc[row_num, measure]
+            if eval(str(measure_value) + alert_operator + str(alert_threshold)):  # pylint: disable=W0123
+                result_data.loc[row_num, 'Alert'] = True
+    return result_data['Alert']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark alert evaluation.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10**4, 10**5, 10**6, 10**7], help='Number of records to evaluate.')
+    parser.add_argument('--measures', type=int, default=3, help='Number of measures per record.')
+    parser.add_argument('--loop-limit', type=int, default=10**4, help='Maximum number of records evaluated with the loop, larger sizes are extrapolated.')
+    arguments = parser.parse_args()
+
+    indicator = Indicator()
+    alert_operator = '>'
+    alert_threshold = '50'
+
+    print(f'{"records":>12} {"loop (s)":>14} {"vectorized (s)":>16} {"speedup":>10}')
+    for nb_records in arguments.sizes:
+        data_frame = get_test_data(nb_records, arguments.measures)
+        measures = list(data_frame.columns)
+
+        # Vectorized evaluation
+        start_time = time.perf_counter()
+        vectorized_alert = indicator.evaluate_alert(data_frame[measures], alert_operator, alert_threshold)
+        vectorized_time = time.perf_counter() - start_time
+
+        # Loop evaluation, extrapolated linearly above the loop limit
+        nb_loop_records = min(nb_records, arguments.loop_limit)
+        loop_data_frame = data_frame.head(nb_loop_records).copy()
+        start_time = time.perf_counter()
+        loop_alert = evaluate_alert_loop(loop_data_frame, measures, alert_operator, alert_threshold)
+        loop_time = (time.perf_counter() - start_time) * nb_records / nb_loop_records
+        estimate = '*' if nb_loop_records < nb_records else ' '
+
+        # Verify both implementations return the same results
+        assert (loop_alert.values == vectorized_alert.head(nb_loop_records).values).all()
+
+        print(f'{nb_records:>12} {loop_time:>13.3f}{estimate} {vectorized_time:>16.4f} {loop_time / vectorized_time:>9.0f}x')
+
+    print('* Extrapolated from the first {} records.'.format(arguments.loop_limit))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Load benchmark of the API proxy against a local stub GraphQL server: flask development server versus gunicorn.
+
+The stub server answers every request with the same JSON body after a fixed delay, simulating a slow upstream.
+Run from the test container:
+$ python test/benchmark/benchmark_api.py --api-dir /srv/api --requests 2000 --clients 32 --delay 0.05
+"""
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import requests
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt import JWT, jwk_from_pem
+
+# Environment variables required to import the API
+API_ENVIRONMENT = {
+    'MAIL_SENDER': 'benchmark@mobydq.io',
+    'HOST_NAME': 'http://127.0.0.1',
+    'TOKEN_ISSUER': 'http://127.0.0.1',
+    'AFTER_LOGIN_REDIRECT': 'http://127.0.0.1',
+    'GITHUB_CLIENT_ID': 'benchmark',
+    'GITHUB_CLIENT_SECRET': 'benchmark',
+    'GOOGLE_CLIENT_ID': 'benchmark',
+    'GOOGLE_CLIENT_SECRET': 'benchmark'
+}
+
+QUERY = '{allSessions(first:100){nodes{id,status,indicatorId,batchId}}}'
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """HTTP server handling each request in a thread."""
+    daemon_threads = True
+
+
+def get_stub_handler(body: bytes, delay: float):
+    """Return a request handler answering POST requests with body after delay."""
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            pass
+
+    return StubHandler
+
+
+def get_stub_body(nb_records: int):
+    """Return a GraphQL response body containing nb_records sessions."""
+    nodes = [{'id': i, 'status': 'Succeeded', 'indicatorId': i % 10, 'batchId': i // 10} for i in range(nb_records)]
+    return json.dumps({'data': {'allSessions': {'nodes': nodes}}}).encode('utf-8')
+
+
+def create_keys(directory: str):
+    """Create an RSA key pair in directory and return the paths of public and private keys."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+    private_pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    public_pem = private_key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+
+    public_key_file = os.path.join(directory, 'public.pem')
+    private_key_file = os.path.join(directory, 'private.pem')
+    with open(public_key_file, 'wb') as fh:
+        fh.write(public_pem)
+    with open(private_key_file, 'wb') as fh:
+        fh.write(private_pem)
+    return public_key_file, private_key_file
+
+
+def create_token(private_key_file: str):
+    """Create a JWT valid for one hour signed with the private key."""
+    with open(private_key_file, 'rb') as fh:
+        signing_key = jwk_from_pem(fh.read())
+    now = time.time()
+    message = {'iss': 'http://127.0.0.1', 'sub': 'benchmark@mobydq.io', 'iat': now, 'exp': now + 3600, 'aud': 'postgraphile'}
+    return JWT().encode(message, signing_key, 'RS256')
+
+
+def start_api(server: str, api_dir: str, port: int, environment: dict, workers: int, threads: int):
+    """Start the API with the given server in a subprocess and wait until it answers health checks."""
+    environment = dict(environment)
+    if server == 'gunicorn':
+        environment.update({'API_WORKERS': str(workers), 'API_THREADS': str(threads)})
+        command = ['gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', '--access-logfile', '', 'api:app']
+    else:
+        environment.update({'FLASK_APP': 'api.py'})
+        command = ['flask', 'run', '--host', '127.0.0.1', '--port', str(port)]
+
+    process = subprocess.Popen(command, cwd=api_dir, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    health_url = f'http://127.0.0.1:{port}/mobydq/api/v1/health'
+    for _ in range(100):
+        try:
+            requests.get(health_url).raise_for_status()
+            return process
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+
+    process.terminate()
+    raise Exception(f'API served by {server} did not start.')
+
+
+def run_load(url: str, token: str, nb_requests: int, nb_clients: int):
+    """Send nb_requests GraphQL queries with nb_clients concurrent clients. Return requests per second and latencies in seconds."""
+    headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'}
+    local = threading.local()
+
+    def send_request(_):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        start_time = time.perf_counter()
+        response = local.session.post(url, headers=headers, json={'query': QUERY})
+        response.raise_for_status()
+        return time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=nb_clients) as executor:
+        latencies = list(executor.map(send_request, range(nb_requests)))
+    total_time = time.perf_counter() - start_time
+    return nb_requests / total_time, sorted(latencies)
+
+
+def get_percentile(sorted_values: list, percentile: float):
+    """Return the percentile of a sorted list of values."""
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load benchmark of the API proxy.')
+    parser.add_argument('--api-dir', type=str, default='/srv/api', help='Directory containing api.py.')
+    parser.add_argument('--servers', type=str, nargs='+', default=['flask', 'gunicorn'], help='Servers to benchmark: flask, gunicorn.')
+    parser.add_argument('--requests', type=int, default=2000, help='Number of requests per server.')
+    parser.add_argument('--clients', type=int, default=32, help='Number of concurrent clients.')
+    parser.add_argument('--delay', type=float, default=0.05, help='Latency in seconds of the stub GraphQL server.')
+    parser.add_argument('--records', type=int, default=100, help='Number of records returned by the stub GraphQL server.')
+    parser.add_argument('--workers', type=int, default=4, help='Number of gunicorn workers.')
+    parser.add_argument('--threads', type=int, default=8, help='Number of threads per gunicorn worker.')
+    arguments = parser.parse_args()
+
+    # Start stub GraphQL server
+    stub_server = ThreadingHTTPServer(('127.0.0.1', 0), get_stub_handler(get_stub_body(arguments.records), arguments.delay))
+    threading.Thread(target=stub_server.serve_forever, daemon=True).start()
+    stub_url = f'http://127.0.0.1:{stub_server.server_address[1]}/graphql'
+
+    with tempfile.TemporaryDirectory() as directory:
+        public_key_file, private_key_file = create_keys(directory)
+        token = create_token(private_key_file)
+        environment = dict(os.environ)
+        environment.update(API_ENVIRONMENT)
+        environment.update({'GRAPHQL_URL': stub_url, 'PUBLIC_KEY_FILE': public_key_file, 'PRIVATE_KEY_FILE': private_key_file})
+
+        print(f'{"server":>10} {"requests/s":>12} {"p50 (ms)":>10} {"p99 (ms)":>10}')
+        for port, server in enumerate(arguments.servers, start=15434):
+            process = start_api(server, arguments.api_dir, port, environment, arguments.workers, arguments.threads)
+            try:
+                url = f'http://127.0.0.1:{port}/mobydq/api/v1/graphql'
+                run_load(url, token, min(100, arguments.requests), arguments.clients)  # Warm up
+                throughput, latencies = run_load(url, token, arguments.requests, arguments.clients)
+            finally:
+                process.terminate()
+                process.wait()
+
+            p50 = get_percentile(latencies, 50) * 1000
+            p99 = get_percentile(latencies, 99) * 1000
+            print(f'{server:>10} {throughput:>12.1f} {p50:>10.1f} {p99:>10.1f}')
+
+    stub_server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark of GraphQL proxy overhead per request: full parse of every payload versus pre-check and parse cache.
+
+Run from the test container:
+$ PYTHONPATH=/srv/api:$PYTHONPATH python test/benchmark/benchmark_proxy.py --requests 10000
+"""
+import argparse
+import time
+from graphql.parser import GraphQLParser
+from proxy.interceptor import Interceptor
+from proxy.utils import validate_graphql_request
+
+# Payloads representative of the ones sent by the web app
+PAYLOADS = {
+    'query': '{allIndicatorGroups(orderBy:NAME_ASC){nodes{id,name,indicatorsByIndicatorGroupId{totalCount}}}}',
+    'large query': '{allIndicators(first:50,orderBy:ID_DESC){nodes{id,name,description,executionOrder,flagActive,indicatorTypeId,'
+                   'indicatorGroupId,indicatorTypeByIndicatorTypeId{id,name},indicatorGroupByIndicatorGroupId{id,name},'
+                   'parametersByIndicatorId{nodes{id,value,parameterTypeId,parameterTypeByParameterTypeId{id,name}}}}}}',
+    'mutation': 'mutation{updateIndicatorById(input:{id:1,indicatorPatch:{flagActive:false}}){indicator{id,flagActive}}}',
+    'intercepted mutation': 'mutation executeBatch($id: Int!) { executeBatch(input: { indicatorGroupId: $id }) { batch {id status } } }'
+}
+
+
+def get_mutation_name_parse(payload: str):
+    """Former implementation parsing every payload."""
+    interceptor = Interceptor()
+    graphql_document = GraphQLParser().parse(payload)
+    return interceptor.get_mutation_name(graphql_document)
+
+
+def get_mutation_name_cached(payload: str):
+    """Current implementation skipping payloads which cannot be intercepted and caching parsed documents."""
+    interceptor = Interceptor()
+    mutation_name = None
+    if interceptor.may_handle_mutation(payload):
+        graphql_document = validate_graphql_request(payload)
+        mutation_name = interceptor.get_mutation_name(graphql_document)
+    return mutation_name
+
+
+def measure(function: callable, payload: str, nb_requests: int):
+    """Return the average time in microseconds taken by function to process payload."""
+    start_time = time.perf_counter()
+    for _ in range(nb_requests):
+        function(payload)
+    return (time.perf_counter() - start_time) / nb_requests * 10**6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark GraphQL proxy overhead per request.')
+    parser.add_argument('--requests', type=int, default=10000, help='Number of requests per payload.')
+    arguments = parser.parse_args()
+
+    print(f'{"payload":>22} {"parse (us)":>12} {"cached (us)":>12} {"speedup":>10}')
+    for name, payload in PAYLOADS.items():
+        # Verify both implementations return the same mutation name
+        assert get_mutation_name_parse(payload) == get_mutation_name_cached(payload)
+
+        parse_time = measure(get_mutation_name_parse, payload, arguments.requests)
+        cached_time = measure(get_mutation_name_cached, payload, arguments.requests)
+        print(f'{name:>22} {parse_time:>12.1f} {cached_time:>12.1f} {parse_time / cached_time:>9.0f}x')
+
+
+if __name__ == '__main__':
+    main()
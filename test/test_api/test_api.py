@@ -1,7 +1,14 @@
 """Unit tests for API components."""
+from unittest import mock
 import json
+import os
+import runpy
+import subprocess
+import sys
 import unittest
+import docker
 import requests
+from proxy import data_source
 
 
 class TestApi(unittest.TestCase):
@@ -25,6 +32,38 @@ class TestApi(unittest.TestCase):
         self.assertEqual(status, 200)
         self.assertIsNotNone(body['message'])
 
+    def test_run_data_source_test(self):
+        """Unit tests for method run_data_source_test of the API proxy."""
+
+        conflict_error = docker.errors.APIError('Conflict', response=mock.Mock(status_code=409))
+        server_error = docker.errors.APIError('Server error', response=mock.Mock(status_code=500))
+        results = []
+        for error in [conflict_error, server_error]:
+            with mock.patch.object(data_source.docker, 'from_env') as from_env, \
+                    mock.patch.object(data_source.utils, 'execute_graphql_request') as execute_graphql_request:
+                from_env.return_value.containers.run.side_effect = error
+                data_source.RUNNING_TESTS.add('0')
+                data_source.run_data_source_test('0')
+                results.append((execute_graphql_request.called, '0' in data_source.RUNNING_TESTS))
+
+        # Assert tests already running in another worker process are not set to Failed and running tests are released
+        self.assertEqual(results, [(False, False), (True, False)])
+        self.assertGreaterEqual(data_source.TEST_CONCURRENCY, 1)
+
+    def test_secret_key(self):
+        """Unit tests for secret key shared by the worker processes serving the API."""
+
+        # Gunicorn configuration is loaded once by the master process, each worker is forked from it and imports the API
+        environment = {key: value for key, value in os.environ.items() if key != 'API_SECRET_KEY'}
+        api_directory = os.path.dirname(data_source.__file__).rsplit(os.sep, 1)[0]
+        command = [sys.executable, '-c', 'import api; print(api.app.secret_key)']
+        with mock.patch.dict(os.environ, environment, clear=True):
+            runpy.run_path(os.path.join(api_directory, 'gunicorn.conf.py'))
+            secret_keys = [subprocess.check_output(command, cwd=api_directory) for _ in range(2)]
+
+        # Assert workers sign session cookies with the same key, otherwise OAuth state is lost when callback is served by another worker
+        self.assertEqual(secret_keys[0], secret_keys[1])
+
 
 if __name__ == '__main__':
     unittest.main()
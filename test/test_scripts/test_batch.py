@@ -1,7 +1,8 @@
 """Unit tests for module /scripts/init/batch.py."""
+from concurrent.futures import ThreadPoolExecutor
 import unittest
 from shared.utils import get_test_case_name
-from scripts.batch import Batch
+from scripts.batch import Batch, get_execution_order, get_executor
 from scripts import utils
 
 
@@ -32,6 +33,32 @@ class TestBatch(unittest.TestCase):
         # Assert batch status is Running
         self.assertEqual(batch_status, 'Running')
 
+    def test_get_execution_order(self):
+        """Unit tests for method get_execution_order."""
+
+        session = {'indicatorByIndicatorId': {'executionOrder': 2}}
+        session_without_order = {'indicatorByIndicatorId': {'executionOrder': None}}
+
+        # Assert indicators without execution order are executed after the others
+        self.assertEqual(get_execution_order(session), 2)
+        self.assertGreater(get_execution_order(session_without_order), get_execution_order(session))
+
+    def test_get_executor(self):
+        """Unit tests for method get_executor."""
+
+        with get_executor(1, 'thread') as executor:
+            sequential_results = list(executor.map(abs, [-1, -2, -3]))
+
+        with get_executor(4, 'thread') as executor:
+            is_thread_pool = isinstance(executor, ThreadPoolExecutor)
+            concurrent_results = list(executor.map(abs, [-1, -2, -3]))
+
+        # Assert results are returned in order regardless of the executor
+        self.assertEqual(sequential_results, [1, 2, 3])
+        self.assertEqual(concurrent_results, [1, 2, 3])
+        self.assertTrue(is_thread_pool)
+        self.assertRaises(ValueError, get_executor, 4, 'invalid')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,79 @@
+"""Unit tests for module /scripts/init/completeness.py."""
+import unittest
+from shared.utils import get_test_case_name
+from scripts.constants import DataSourceType
+from scripts.completeness import Completeness
+from scripts import utils
+
+
+class TestCompleteness(unittest.TestCase):
+    """Unit tests for class Completeness."""
+
+    def test_get_completeness_request(self):
+        """Unit tests for method get_completeness_request."""
+
+        completeness = Completeness()
+        source_request = 'SELECT dimension_1, measure_1 FROM source_table;'
+        target_request = 'SELECT dimension_1, measure_1 FROM target_table ; '
+
+        # Assert data source types which do not support pushdown fall back to in memory comparison
+        for data_source_type_id in [DataSourceType.HIVE_ID, DataSourceType.MYSQL_ID, DataSourceType.ORACLE_ID, DataSourceType.SQLITE_ID]:
+            request = completeness.get_completeness_request(data_source_type_id, source_request, target_request, 1, 1, '>=', '10')
+            self.assertIsNone(request)
+
+        # Assert requests are joined as subqueries and alert operator is translated to SQL
+        request = completeness.get_completeness_request(DataSourceType.POSTGRESQL_ID, source_request, target_request, 1, 1, '!=', '0')
+        self.assertIn('FROM (SELECT dimension_1, measure_1 FROM source_table) AS source_data (d0, m0)', request)
+        self.assertIn('FULL OUTER JOIN (SELECT dimension_1, measure_1 FROM target_table) AS target_data (d0, m0)', request)
+        self.assertIn('ABS(m0_delta_percentage) * 100 <> 0.0', request)
+        self.assertNotIn(';', request)
+        self.assertIn("COALESCE(CAST(source_data.d0 AS TEXT), '') = COALESCE(CAST(target_data.d0 AS TEXT), '')", request)
+        self.assertNotIn('VARCHAR(4000)', request)
+
+        # Assert dimensions are compared with their native types when there is no unbounded text type
+        request = completeness.get_completeness_request(DataSourceType.TERADATA_ID, source_request, target_request, 1, 1, '!=', '0')
+        self.assertIn('(source_data.d0 = target_data.d0 OR (source_data.d0 IS NULL AND target_data.d0 IS NULL))', request)
+
+        self.assertRaises(ValueError, completeness.get_completeness_request, DataSourceType.POSTGRESQL_ID, source_request, target_request, 1, 1, '<>', '0')
+
+    def test_evaluate_completeness_pushdown(self):
+        """Unit tests for method evaluate_completeness_pushdown."""
+
+        # Create data source
+        test_case_name = get_test_case_name()
+        mutation_create_data_source = '''mutation{createDataSource(input:{dataSource:{name:"test_case_name",connectionString:"driver={PostgreSQL Unicode};server=db-postgresql;port=5432;database=star_wars;",login:"postgres",password:"1234",dataSourceTypeId:7}}){dataSource{name}}}'''
+        mutation_create_data_source = mutation_create_data_source.replace('test_case_name', str(test_case_name))  # Use replace() instead of format() because of curly braces
+        data_source = utils.execute_graphql_request(mutation_create_data_source)
+        data_source = data_source['data']['createDataSource']['dataSource']['name']
+
+        # Set parameters, target misses some records so that deltas and alerts are computed
+        source_request = 'SELECT gender, COUNT(id), AVG(height) FROM people GROUP BY gender;'
+        target_request = 'SELECT gender, COUNT(id), AVG(height) FROM people WHERE id % 3 <> 0 GROUP BY gender;'
+        dimensions = ['gender']
+        measures = ['nb_people', 'avg_height']
+        completeness = Completeness()
+        result_data = completeness.evaluate_completeness_pushdown(data_source, source_request, target_request, dimensions, measures, '>', '10')
+        source_data, target_data = completeness.get_data_frames(
+            (data_source, source_request, dimensions, measures),
+            (data_source, target_request, dimensions, measures))
+        expected_data = completeness.evaluate_completeness(source_data, target_data, dimensions, measures, '>', '10')
+
+        # Assert request is executed on PostgreSQL and returns the same results as in memory comparison
+        self.assertIsNotNone(result_data)
+        result_data = result_data.sort_values(dimensions).reset_index(drop=True)
+        expected_data = expected_data.sort_values(dimensions).reset_index(drop=True)
+        self.assertEqual(list(result_data.columns), list(expected_data.columns))
+        self.assertEqual(result_data['gender'].tolist(), expected_data['gender'].tolist())
+        self.assertEqual(result_data['Alert'].tolist(), expected_data['Alert'].tolist())
+        for column in result_data.columns[1:-1]:
+            for value, expected_value in zip(result_data[column], expected_data[column]):
+                self.assertAlmostEqual(float(value), float(expected_value), places=5)
+
+        # Assert failed requests fall back to in memory comparison
+        invalid_request = 'SELECT gender, COUNT(invalid_column), AVG(height) FROM people GROUP BY gender;'
+        result_data = completeness.evaluate_completeness_pushdown(data_source, invalid_request, target_request, dimensions, measures, '>', '10')
+        self.assertIsNone(result_data)
+
+
+if __name__ == '__main__':
+    unittest.main()
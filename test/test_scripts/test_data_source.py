@@ -1,7 +1,11 @@
 """Unit tests for module /scripts/init/data_source.py."""
 import unittest
-from scripts.data_source import DataSource
+from unittest import mock
+from shared.utils import get_test_case_name
+from scripts import data_source as data_source_module
+from scripts.data_source import ConnectionPool, DataSource, clear_data_sources, get_connection_pool, get_data_source, prefetch_data_sources, quote_identifier
 from scripts.constants import DataSourceType
+from scripts import utils
 
 
 class TestDataSource(unittest.TestCase):
@@ -136,6 +140,101 @@ class TestDataSource(unittest.TestCase):
         # TODO:
         pass
 
+    def test_prefetch_data_sources(self):
+        """Unit tests for methods prefetch_data_sources, get_data_source and clear_data_sources."""
+
+        # Create data source
+        test_case_name = get_test_case_name()
+        mutation_create_data_source = 'mutation createDataSource($dataSource:DataSourceInput!){createDataSource(input:{dataSource:$dataSource}){dataSource{id}}}'
+        variables = {'dataSource': {'name': test_case_name, 'connectionString': './star_wars.db', 'password': '1234', 'dataSourceTypeId': DataSourceType.SQLITE_ID}}
+        utils.execute_graphql_request(mutation_create_data_source, variables)
+
+        # Prefetch data source and get it without request to the GraphQL API
+        initial_statistics = utils.get_graphql_client().get_statistics()
+        prefetch_data_sources([test_case_name, test_case_name + ' missing'])
+        statistics = utils.get_graphql_client().get_statistics()
+        cached_names = set(data_source_module.DATA_SOURCE_CACHE)
+        data_source = get_data_source(test_case_name)
+        new_statistics = utils.get_graphql_client().get_statistics()
+        clear_data_sources()
+
+        # Assert only requested data sources are fetched in two requests, decrypted from the cache and cache is cleared
+        self.assertEqual(statistics['request_count'], initial_statistics['request_count'] + 2)
+        self.assertEqual(cached_names, {test_case_name})
+        self.assertEqual(data_source['password'], '1234')
+        self.assertEqual(new_statistics['request_count'], statistics['request_count'])
+        self.assertNotIn(test_case_name, data_source_module.DATA_SOURCE_CACHE)
+
+    def test_connection_pool(self):
+        """Unit tests for class ConnectionPool."""
+
+        data_source = {'id': 0, 'dataSourceTypeId': DataSourceType.SQLITE_ID, 'connectionString': './star_wars.db', 'login': None, 'password': None}
+        connection_pool = ConnectionPool(max_size=1, idle_timeout=300)
+
+        # Check out, check in and check out again the same connection
+        connection = connection_pool.get_connection(data_source)
+        connection_pool.release_connection(data_source, connection)
+        same_connection = connection_pool.get_connection(data_source)
+        result = same_connection.execute("SELECT name FROM planet WHERE name='Tatooine';").fetchone()[0]
+        connection_pool.release_connection(data_source, same_connection, is_reusable=False)
+        statistics = connection_pool.close()
+
+        # Assert connection is reused
+        self.assertIs(connection, same_connection)
+        self.assertEqual(result, 'Tatooine')
+        self.assertEqual(statistics['hits'], 1)
+        self.assertEqual(statistics['misses'], 1)
+
+    def test_quote_identifier(self):
+        """Unit tests for method quote_identifier."""
+
+        # Assert identifiers are quoted according to data source type and quote characters are escaped
+        self.assertEqual(quote_identifier(DataSourceType.POSTGRESQL_ID, 'created_date'), '"created_date"')
+        self.assertEqual(quote_identifier(DataSourceType.SQLITE_ID, 'id" > 0 OR "1'), '"id"" > 0 OR ""1"')
+        self.assertEqual(quote_identifier(DataSourceType.MYSQL_ID, 'created`date'), '`created``date`')
+
+    def test_get_connection_pool(self):
+        """Unit tests for method get_connection_pool."""
+
+        data_source_module.CONNECTION_POOL = ConnectionPool(max_size=1, idle_timeout=300)
+        try:
+            connection_pool = get_connection_pool()
+            with mock.patch.object(data_source_module.os, 'getpid', return_value=-1):
+                child_connection_pool = get_connection_pool()
+        finally:
+            data_source_module.CONNECTION_POOL = None
+
+        # Assert connection pool is not used by child processes which inherited it
+        self.assertIsNotNone(connection_pool)
+        self.assertIsNone(child_connection_pool)
+
+    def test_test_many(self):
+        """Unit tests for method test_many."""
+
+        # Create data sources
+        test_case_name = get_test_case_name()
+        mutation_create_data_source = 'mutation createDataSource($dataSource:DataSourceInput!){createDataSource(input:{dataSource:$dataSource}){dataSource{id}}}'
+        variables = {'dataSource': {'name': test_case_name, 'connectionString': './star_wars.db', 'dataSourceTypeId': DataSourceType.SQLITE_ID}}
+        data_source = utils.execute_graphql_request(mutation_create_data_source, variables)
+        data_source_id = data_source['data']['createDataSource']['dataSource']['id']
+
+        variables = {'dataSource': {'name': test_case_name + '_invalid', 'connectionString': 'driver={FreeTDS};server=invalid;port=1433;', 'dataSourceTypeId': DataSourceType.MSSQL_ID}}
+        data_source = utils.execute_graphql_request(mutation_create_data_source, variables)
+        invalid_data_source_id = data_source['data']['createDataSource']['dataSource']['id']
+
+        # Test connectivity to both data sources
+        results = DataSource().test_many([data_source_id, invalid_data_source_id])
+
+        # Get connectivity status
+        query = 'query getDataSource($id:Int!){dataSourceById(id:$id){connectivityStatus}}'
+        data = utils.execute_graphql_request(query, {'id': invalid_data_source_id})
+
+        # Assert connectivity status and latency are returned and updated
+        self.assertEqual(results[data_source_id]['connectivityStatus'], 'Success')
+        self.assertGreaterEqual(results[data_source_id]['latency'], 0)
+        self.assertEqual(results[invalid_data_source_id]['connectivityStatus'], 'Failed')
+        self.assertEqual(data['data']['dataSourceById']['connectivityStatus'], 'Failed')
+
 
 if __name__ == '__main__':
     unittest.main()
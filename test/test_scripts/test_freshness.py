@@ -0,0 +1,40 @@
+"""Unit tests for module /scripts/init/freshness.py."""
+import json
+import unittest
+import pandas
+from scripts.freshness import Freshness
+
+
+class TestFreshness(unittest.TestCase):
+    """Unit tests for class Freshness."""
+
+    def test_merge_freshness(self):
+        """Unit tests for method merge_freshness."""
+
+        # State data is persisted as JSON with timestamps as epoch in microseconds
+        freshness = Freshness()
+        state_data = pandas.DataFrame({
+            'dimension_1': ['a', 'b'],
+            'measure_1': pandas.to_datetime(['2019-01-01 10:00:00.123456', '2019-01-01 12:00:00.000000'])})
+        state_data = json.loads(state_data.to_json(orient='split', date_unit='us'))
+        state_data = pandas.DataFrame(state_data['data'], columns=state_data['columns'])
+        target_data = pandas.DataFrame({
+            'dimension_1': ['a', 'c'],
+            'measure_1': pandas.to_datetime(['2019-01-02 08:00:00', '2019-01-01 09:00:00'])})
+
+        # Assert most recent timestamp is kept per dimensions
+        result_data = freshness.merge_freshness(state_data, target_data, ['dimension_1'], ['measure_1'])
+        result_data = result_data.sort_values('dimension_1').reset_index(drop=True)
+        self.assertEqual(result_data['dimension_1'].tolist(), ['a', 'b', 'c'])
+        self.assertEqual(result_data['measure_1'].tolist(), list(pandas.to_datetime(['2019-01-02 08:00:00', '2019-01-01 12:00:00', '2019-01-01 09:00:00'])))
+
+        # Assert microseconds are preserved and a single record is returned without dimensions
+        state_data = pandas.DataFrame({'measure_1': [1546336800123456]})
+        target_data = pandas.DataFrame({'measure_1': pandas.to_datetime(['2019-01-01 09:00:00'])})
+        result_data = freshness.merge_freshness(state_data, target_data, [], ['measure_1'])
+        self.assertEqual(len(result_data), 1)
+        self.assertEqual(result_data['measure_1'].tolist(), [pandas.Timestamp('2019-01-01 10:00:00.123456')])
+
+
+if __name__ == '__main__':
+    unittest.main()
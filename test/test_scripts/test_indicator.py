@@ -1,8 +1,17 @@
 """Unit tests for module /scripts/init/indicator.py."""
+from datetime import datetime
+from decimal import Decimal
+import gzip
+import io
+import json
+import tempfile
 import unittest
+from unittest import mock
+import pandas
 from shared.utils import get_test_case_name
-from scripts.constants import IndicatorType
-from scripts.indicator import Indicator
+from scripts.constants import DataSourceType, IndicatorType
+from scripts.indicator import Indicator, ResultCache, decode_watermark, encode_watermark, normalize_request
+from scripts.session import delete_session_result_detail
 from scripts import utils
 
 
@@ -221,6 +230,77 @@ class TestIndicator(unittest.TestCase):
         self.assertEqual(len(verified_parameters[4]), 3)
         self.assertEqual(len(verified_parameters[5]), 3)
 
+    def test_get_indicator_config(self):
+        """Unit tests for method get_indicator_config."""
+
+        parameters = [
+            {'parameterTypeId': 1, 'value': '>='},  # Alert operator
+            {'parameterTypeId': 2, 'value': '10'},  # Alert threshold
+            {'parameterTypeId': 3, 'value': "['email_1']"},  # Distribution list
+            {'parameterTypeId': 4, 'value': "['dimension_1', 'dimension_2']"},  # Dimensions
+            {'parameterTypeId': 5, 'value': "['measure_1']"},  # Measures
+            {'parameterTypeId': 8, 'value': 'Target'},  # Target
+            {'parameterTypeId': 9, 'value': 'Target request'}  # Target request
+        ]
+
+        indicator = Indicator()
+        config = indicator.get_indicator_config(IndicatorType.VALIDITY, parameters)
+        same_config = indicator.get_indicator_config(IndicatorType.VALIDITY, list(reversed(parameters)))
+
+        # Assert parameters are parsed and compiled once
+        self.assertIs(config, same_config)
+        self.assertEqual(config.dimensions, ['dimension_1', 'dimension_2'])
+        self.assertEqual(config.measures, ['measure_1'])
+        self.assertIsNone(config.source)
+        self.assertTrue(config.alert_function(10, 10))
+
+    def test_verify_indicator_parameters_watermark(self):
+        """Unit tests for method verify_indicator_parameters with parameter watermark."""
+
+        indicator = Indicator()
+        parameters = [
+            {'parameterTypeId': 1, 'value': '>'},
+            {'parameterTypeId': 2, 'value': '0'},
+            {'parameterTypeId': 3, 'value': "['test@mobydq.io']"},
+            {'parameterTypeId': 4, 'value': "['name']"},
+            {'parameterTypeId': 5, 'value': "['id']"},
+            {'parameterTypeId': 8, 'value': 'star_wars'},
+            {'parameterTypeId': 9, 'value': 'SELECT name, id FROM planet;'}]
+
+        # Assert watermark must be a dimension or measure and is only supported by freshness and validity indicators
+        indicator_parameters = indicator.verify_indicator_parameters(IndicatorType.VALIDITY, parameters + [{'parameterTypeId': 10, 'value': 'id'}])
+        self.assertEqual(indicator_parameters[10], 'id')
+        self.assertRaises(Exception, indicator.verify_indicator_parameters, IndicatorType.VALIDITY, parameters + [{'parameterTypeId': 10, 'value': 'created_date'}])
+        self.assertRaises(Exception, indicator.verify_indicator_parameters, IndicatorType.COMPLETENESS, parameters + [{'parameterTypeId': 10, 'value': 'id'}])
+
+    def test_get_incremental_data_frame(self):
+        """Unit tests for method get_incremental_data_frame."""
+
+        # Create data source
+        test_case_name = get_test_case_name()
+        mutation_create_data_source = 'mutation createDataSource($dataSource:DataSourceInput!){createDataSource(input:{dataSource:$dataSource}){dataSource{name}}}'
+        variables = {'dataSource': {'name': test_case_name, 'connectionString': './star_wars.db', 'dataSourceTypeId': DataSourceType.SQLITE_ID}}
+        data_source = utils.execute_graphql_request(mutation_create_data_source, variables)
+        data_source = data_source['data']['createDataSource']['dataSource']['name']
+
+        # Get all records, then records above a watermark, then no new record
+        request = 'SELECT name, id FROM planet;'
+        dimensions = ['name']
+        measures = ['id']
+        indicator = Indicator()
+        all_data, watermark = indicator.get_incremental_data_frame(data_source, request, dimensions, measures, 'id', None)
+        new_data, new_watermark = indicator.get_incremental_data_frame(data_source, request, dimensions, measures, 'id', 50)
+        empty_data, empty_watermark = indicator.get_incremental_data_frame(data_source, request, dimensions, measures, 'id', watermark)
+
+        # Assert records are filtered on the watermark and the watermark is the highest value returned
+        self.assertEqual(watermark, all_data['id'].max())
+        self.assertEqual(sorted(new_data['id'].tolist()), sorted(all_data.loc[all_data['id'] > 50, 'id'].tolist()))
+        self.assertEqual(new_watermark, watermark)
+        self.assertTrue(empty_data.empty)
+        self.assertEqual(empty_watermark, watermark)
+        self.assertRaises(ValueError, indicator.get_incremental_data_frame, data_source, request, dimensions, measures, 'planet_id', None)
+        self.assertRaises(Exception, indicator.get_incremental_data_frame, data_source, request, dimensions, measures, 'id > 0 OR 1', 50)
+
     def test_get_data_frame(self):
         """Unit tests for method get_data_frame."""
 
@@ -244,6 +324,88 @@ class TestIndicator(unittest.TestCase):
         self.assertEqual(nb_records, 5)
         self.assertEqual(nb_females, 19)
 
+    def test_compact_data_frame(self):
+        """Unit tests for method compact_data_frame."""
+
+        indicator = Indicator()
+        data_frame = pandas.DataFrame({
+            'dimension_1': ['a', 'b', 'a', 'b'],
+            'measure_1': [1, 2, 3, 400],
+            'measure_2': [0.5, 1.25, None, 2],
+            'measure_3': [0.1, 0.2, 0.3, 0.4]})
+        expected_data_frame = data_frame.copy()
+        result_data = indicator.compact_data_frame(data_frame, ['dimension_1'], ['measure_1', 'measure_2', 'measure_3'])
+
+        # Assert dimensions are categoricals and measures are downcast only when values are preserved
+        self.assertEqual(str(result_data['dimension_1'].dtype), 'category')
+        self.assertEqual(str(result_data['measure_1'].dtype), 'int16')
+        self.assertEqual(str(result_data['measure_2'].dtype), 'float32')
+        self.assertEqual(str(result_data['measure_3'].dtype), 'float64')
+        self.assertEqual(result_data['dimension_1'].tolist(), expected_data_frame['dimension_1'].tolist())
+        for measure in ['measure_1', 'measure_2', 'measure_3']:
+            self.assertTrue(result_data[measure].astype(float).equals(expected_data_frame[measure].astype(float)))
+
+    def test_encode_watermark(self):
+        """Unit tests for methods encode_watermark and decode_watermark."""
+
+        watermarks = [
+            (datetime(2018, 1, 1, 12, 30, 15, 250), datetime),
+            (pandas.Series([1, 3, 2]).max(), int),
+            (Decimal('10.25'), Decimal),
+            ('abc', str)]
+        for watermark, watermark_type in watermarks:
+            encoded_watermark = json.loads(json.dumps(encode_watermark(watermark)))
+            decoded_watermark = decode_watermark(encoded_watermark)
+
+            # Assert watermarks are serialized to JSON without losing their value and are converted to request parameter types
+            self.assertEqual(decoded_watermark, watermark)
+            self.assertIs(type(decoded_watermark), watermark_type)
+
+    def test_result_cache(self):
+        """Unit tests for class ResultCache and method normalize_request."""
+
+        result_cache = ResultCache(max_size=10**6)
+        data_frame = pandas.DataFrame({'dimension_1': ['a', 'b'], 'measure_1': [1, 2]})
+        key_1 = ('data_source_1', normalize_request('SELECT a,  b\nFROM t;'), ('dimension_1',), ('measure_1',))
+        key_2 = ('data_source_1', normalize_request(' SELECT a, b FROM t '), ('dimension_1',), ('measure_1',))
+        result_data_1 = result_cache.get_data_frame(key_1, data_frame.copy)
+        result_data_1['measure_1'] = 0
+        result_data_2 = result_cache.get_data_frame(key_2, lambda: self.fail('Extraction executed twice.'))
+
+        # Assert identical requests are executed once and sessions cannot modify cached data frames
+        self.assertEqual(key_1, key_2)
+        self.assertNotEqual(normalize_request("SELECT 'a  b'"), normalize_request("SELECT 'a b'"))
+        self.assertTrue(result_data_2.equals(data_frame))
+        self.assertEqual(result_cache.close(), {'hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_get_data_frames(self):
+        """Unit tests for method get_data_frames."""
+
+        # Create data source
+        test_case_name = get_test_case_name()
+        mutation_create_data_source = '''mutation{createDataSource(input:{dataSource:{name:"test_case_name",connectionString:"driver={PostgreSQL Unicode};server=db-postgresql;port=5432;database=star_wars;",login:"postgres",password:"1234",dataSourceTypeId:7}}){dataSource{name}}}'''
+        mutation_create_data_source = mutation_create_data_source.replace('test_case_name', str(test_case_name))  # Use replace() instead of format() because of curly braces
+        data_source = utils.execute_graphql_request(mutation_create_data_source)
+        data_source = data_source['data']['createDataSource']['dataSource']['name']
+
+        # Set parameters and call method
+        request = 'SELECT gender, COUNT(id) FROM people GROUP BY gender;'
+        invalid_request = 'SELECT gender, COUNT(id) FROM invalid_table GROUP BY gender;'
+        dimensions = ['gender']
+        measures = ['nb_people']
+        indicator = Indicator()
+        source_data, target_data = indicator.get_data_frames(
+            (data_source, request, dimensions, measures),
+            (data_source, request, dimensions, measures))
+
+        # Assert data frames are correct and errors are raised
+        self.assertEqual(len(source_data), 5)
+        self.assertEqual(len(target_data), 5)
+        self.assertRaises(
+            Exception, indicator.get_data_frames,
+            (data_source, request, dimensions, measures),
+            (data_source, invalid_request, dimensions, measures))
+
     def test_is_alert(self):
         """Unit tests for method is_alert."""
 
@@ -263,6 +425,140 @@ class TestIndicator(unittest.TestCase):
         self.assertTrue(smaller_equal)
         self.assertTrue(different)
 
+    def test_evaluate_alert(self):
+        """Unit tests for method evaluate_alert."""
+
+        indicator = Indicator()
+        measure_data = pandas.DataFrame({'measure_1': [0, 1, 2, 3], 'measure_2': [3.5, 0, -1, 2]})
+
+        for alert_operator in ['==', '>', '>=', '<', '<=', '!=']:
+            alert = indicator.evaluate_alert(measure_data, alert_operator, '2')
+
+            # Assert vectorized evaluation returns the same results as is_alert
+            for row_num in measure_data.index:
+                expected_alert = any(indicator.is_alert(value, alert_operator, '2') for value in measure_data.loc[row_num])
+                self.assertEqual(alert[row_num], expected_alert)
+
+        self.assertRaises(ValueError, indicator.evaluate_alert, measure_data, '<>', '2')
+
+    def test_evaluate_data_frame_chunks(self):
+        """Unit tests for method evaluate_data_frame_chunks."""
+
+        indicator = Indicator()
+        data_frame = pandas.DataFrame({'measure_1': [0, 1, 2, 3, 4]})
+        chunks = [data_frame.iloc[0:2], data_frame.iloc[2:4], data_frame.iloc[4:5]]
+
+        def evaluate_function(chunk):
+            result_data = chunk.copy()
+            result_data['Alert'] = indicator.evaluate_alert(result_data[['measure_1']], '>=', '2')
+            return result_data
+
+        nb_records, nb_records_alert, alert_data = indicator.evaluate_data_frame_chunks(chunks, evaluate_function)
+
+        # Assert chunked evaluation returns the same results as a single evaluation
+        self.assertEqual(nb_records, 5)
+        self.assertEqual(nb_records_alert, 3)
+        self.assertEqual(alert_data['measure_1'].tolist(), [2, 3, 4])
+
+    def test_read_partitions(self):
+        """Unit tests for methods partition_data_frame and read_partitions."""
+
+        indicator = Indicator()
+        source_data = pandas.DataFrame({'dimension_1': ['a', 'b', 'c', 'd'], 'measure_1': [1, 2, 3, 4]})
+        target_data = pandas.DataFrame({'dimension_1': ['b', 'c', 'd', 'e'], 'measure_1': [2, 0, 3, 5]})
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Spill data frames in two chunks each
+            for chunk_number, chunk in enumerate([source_data.iloc[0:2], source_data.iloc[2:4]]):
+                indicator.partition_data_frame(chunk, ['dimension_1'], 3, directory, '0', chunk_number)
+            for chunk_number, chunk in enumerate([target_data.iloc[0:2], target_data.iloc[2:4]]):
+                indicator.partition_data_frame(chunk, ['dimension_1'], 3, directory, '1', chunk_number)
+
+            partitions = list(indicator.read_partitions(directory, 3))
+
+        # Assert each dimension is read once per side and both sides of a dimension are in the same partition
+        source_dimensions = [value for partition in partitions for value in partition[0]['dimension_1']]
+        target_dimensions = [value for partition in partitions for value in partition[1]['dimension_1']]
+        self.assertEqual(sorted(source_dimensions), ['a', 'b', 'c', 'd'])
+        self.assertEqual(sorted(target_dimensions), ['b', 'c', 'd', 'e'])
+        for source_partition, target_partition in partitions:
+            for value in set(source_partition['dimension_1']) & set(target_dimensions):
+                self.assertIn(value, target_partition['dimension_1'].tolist())
+
+    def test_get_alert_attachment(self):
+        """Unit tests for method get_alert_attachment."""
+
+        indicator = Indicator()
+        result_data = pandas.DataFrame({'dimension_1': ['a', 'b', 'c'], 'measure_1': [1, 2, 3], 'Alert': [True, False, True]})
+        (file_name, content), nb_records_attached = indicator.get_alert_attachment(1, 2, result_data)
+        attached_data = pandas.read_csv(io.BytesIO(gzip.decompress(content)))
+
+        # Assert attachment is a compressed csv file containing only records in alert
+        self.assertEqual(file_name, 'indicator_1_session_2.csv.gz')
+        self.assertEqual(nb_records_attached, 2)
+        self.assertEqual(attached_data['dimension_1'].tolist(), ['a', 'c'])
+
+    def test_store_result_detail(self):
+        """Unit tests for method store_result_detail."""
+
+        # Create test indicator group, indicator, batch and session
+        test_case_name = get_test_case_name()
+        mutation_create_indicator_group = 'mutation{createIndicatorGroup(input:{indicatorGroup:{name:"test_case_name"}}){indicatorGroup{id}}}'
+        mutation_create_indicator_group = mutation_create_indicator_group.replace('test_case_name', str(test_case_name))  # Use replace() instead of format() because of curly braces
+        indicator_group = utils.execute_graphql_request(mutation_create_indicator_group)
+        indicator_group_id = indicator_group['data']['createIndicatorGroup']['indicatorGroup']['id']
+
+        mutation_create_indicator = 'mutation{createIndicator(input:{indicator:{name:"test_case_name",flagActive:true,indicatorTypeId:4,indicatorGroupId:indicator_group_id}}){indicator{id}}}'
+        mutation_create_indicator = mutation_create_indicator.replace('test_case_name', str(test_case_name))  # Use replace() instead of format() because of curly braces
+        mutation_create_indicator = mutation_create_indicator.replace('indicator_group_id', str(indicator_group_id))  # Use replace() instead of format() because of curly braces
+        indicator = utils.execute_graphql_request(mutation_create_indicator)
+        indicator_id = indicator['data']['createIndicator']['indicator']['id']
+
+        mutation_create_batch = 'mutation{createBatch(input:{batch:{indicatorGroupId:indicator_group_id,status:"Pending"}}){batch{id}}}'
+        mutation_create_batch = mutation_create_batch.replace('indicator_group_id', str(indicator_group_id))  # Use replace() instead of format() because of curly braces
+        batch = utils.execute_graphql_request(mutation_create_batch)
+        batch_id = batch['data']['createBatch']['batch']['id']
+
+        mutation_create_session = 'mutation{createSession(input:{session:{indicatorId:indicator_id,batchId:batch_id,status:"Pending"}}){session{id}}}'
+        mutation_create_session = mutation_create_session.replace('indicator_id', str(indicator_id))  # Use replace() instead of format() because of curly braces
+        mutation_create_session = mutation_create_session.replace('batch_id', str(batch_id))  # Use replace() instead of format() because of curly braces
+        session = utils.execute_graphql_request(mutation_create_session)
+        session_id = session['data']['createSession']['session']['id']
+
+        # Records contain characters which must be escaped in JSON and CSV
+        indicator = Indicator()
+        dimensions = ['a "quoted", value', 'line 1\nline 2', 'back\\slash;']
+        result_data = pandas.DataFrame({'dimension_1': dimensions, 'measure_1': [1, 2, 3], 'Alert': [True, False, True]})
+
+        def get_result_detail():
+            connection = utils.get_database_connection()
+            try:
+                with connection, connection.cursor() as cursor:
+                    cursor.execute('SELECT alert, record FROM base.session_result_detail WHERE session_id = %s ORDER BY id;', (session_id,))
+                    return cursor.fetchall()
+            finally:
+                connection.close()
+
+        stored_records = {}
+        for result_detail in ['none', 'alert', 'all']:
+            with mock.patch('scripts.indicator.utils.get_parameter', return_value=result_detail):
+                nb_records = indicator.store_result_detail(session_id, result_data)
+            stored_records[result_detail] = (nb_records, get_result_detail())
+            delete_session_result_detail(session_id)
+
+        # Assert records are stored according to parameter result detail and read back unchanged
+        self.assertEqual(stored_records['none'], (0, []))
+        self.assertEqual(stored_records['alert'][0], 2)
+        self.assertEqual([alert for alert, _ in stored_records['alert'][1]], [True, True])
+        self.assertEqual([record['dimension_1'] for _, record in stored_records['alert'][1]], [dimensions[0], dimensions[2]])
+        self.assertEqual(stored_records['all'][0], 3)
+        self.assertEqual([alert for alert, _ in stored_records['all'][1]], [True, False, True])
+        self.assertEqual([record['dimension_1'] for _, record in stored_records['all'][1]], dimensions)
+        self.assertEqual([record['measure_1'] for _, record in stored_records['all'][1]], [1, 2, 3])
+
+        # Assert records of the session are deleted
+        self.assertEqual(get_result_detail(), [])
+
     def test_compute_session_result(self):
         """Unit tests for method compute_session_result."""
         pass
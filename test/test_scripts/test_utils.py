@@ -1,5 +1,9 @@
 """Unit tests for module /scripts/init/utils.py."""
+import threading
+import time
 import unittest
+from unittest import mock
+from shared.utils import get_test_case_name
 from scripts import utils
 
 
@@ -26,6 +30,132 @@ class TestUtils(unittest.TestCase):
         # Assert graphql query returned records
         self.assertGreater(nb_records, 0)
 
+    def test_execute_graphql_request_variables(self):
+        """Unit tests for method execute_graphql_request with variables."""
+
+        payload = 'query getDataSourceType($id:Int!){dataSourceTypeById(id:$id){id}}'
+        statistics = utils.get_graphql_client().get_statistics()
+        data = utils.execute_graphql_request(payload, {'id': 1})
+        new_statistics = utils.get_graphql_client().get_statistics()
+
+        # Assert variables are used and request is counted
+        self.assertEqual(data['data']['dataSourceTypeById']['id'], 1)
+        self.assertEqual(new_statistics['request_count'], statistics['request_count'] + 1)
+        self.assertGreater(new_statistics['request_time'], statistics['request_time'])
+
+    def test_mutation_buffer(self):
+        """Unit tests for class MutationBuffer."""
+
+        test_case_name = get_test_case_name()
+        mutation_buffer = utils.MutationBuffer()
+        mutation_buffer.add('createIndicatorGroup', 'CreateIndicatorGroupInput', {'indicatorGroup': {'name': test_case_name + ' 1'}}, 'indicatorGroup{name}')
+        mutation_buffer.add('createIndicatorGroup', 'CreateIndicatorGroupInput', {'indicatorGroup': {'name': test_case_name + ' 2'}}, 'indicatorGroup{name}')
+        statistics = utils.get_graphql_client().get_statistics()
+        results = mutation_buffer.flush()
+        new_statistics = utils.get_graphql_client().get_statistics()
+
+        # Assert mutations are executed in order in a single request
+        self.assertEqual(results[0]['indicatorGroup']['name'], test_case_name + ' 1')
+        self.assertEqual(results[1]['indicatorGroup']['name'], test_case_name + ' 2')
+        self.assertEqual(new_statistics['request_count'], statistics['request_count'] + 1)
+        self.assertEqual(mutation_buffer.flush(), [])
+
+    def test_mail_session(self):
+        """Unit tests for class MailSession and method get_template."""
+
+        # Add alerts to the digest of a mail session
+        mail_session = utils.MailSession(is_digest=True)
+        mail_session.add_alert(['a@mobydq.io', 'b@mobydq.io'], None, indicator_name='indicator_1')
+        mail_session.add_alert(['b@mobydq.io', 'a@mobydq.io'], ('file.csv.gz', b''), indicator_name='indicator_2')
+        mail_session.add_alert(['c@mobydq.io'], None, indicator_name='indicator_3')
+
+        # Assert alerts are grouped per distribution list and templates are compiled once
+        self.assertEqual(len(mail_session.digests), 2)
+        self.assertEqual(len(mail_session.digests[('a@mobydq.io', 'b@mobydq.io')]), 2)
+        self.assertIs(utils.get_template('digest'), utils.get_template('digest'))
+
+    def test_mail_session_notifications(self):
+        """Unit tests for queue of notifications of class MailSession."""
+
+        # Enqueue a notification which fails once and a notification which always fails
+        attempts = []
+
+        def send_function():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise Exception('Connection refused.')
+            return True
+
+        def failed_function():
+            raise Exception('Connection refused.')
+
+        mail_session = utils.MailSession(is_digest=False, queue_size=10, retries=1)
+        mail_session.enqueue(1, 'alert', send_function)
+        mail_session.enqueue(1, 'error', failed_function)
+        statistics = mail_session.flush(timeout=10)
+
+        # Assert notifications are retried and delivery outcomes are recorded
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(statistics, {'sent': 1, 'failed': 1, 'retries': 2, 'pending': 0})
+
+    def test_mail_session_flush_timeout(self):
+        """Unit tests for flush timeout of class MailSession."""
+
+        # Block the background thread on a first notification while a second notification fills the queue
+        is_released = threading.Event()
+        mail_session = utils.MailSession(is_digest=False, queue_size=1, retries=0)
+        mail_session.enqueue(1, 'alert', is_released.wait)
+        time.sleep(0.1)
+        mail_session.enqueue(2, 'alert', is_released.wait)
+        start_time = time.monotonic()
+        statistics = mail_session.flush(timeout=1)
+        flush_time = time.monotonic() - start_time
+        is_released.set()
+
+        # Assert flush returns within its timeout and only the queued notification is pending
+        self.assertLess(flush_time, 2)
+        self.assertEqual(statistics['pending'], 1)
+
+    def test_mail_session_close_timeout(self):
+        """Unit tests for close timeout of class MailSession."""
+
+        # Hold the smtp connection as if a notification was being sent
+        mail_session = utils.MailSession(is_digest=False)
+        mail_session.connection_lock.acquire()
+        try:
+            start_time = time.monotonic()
+            statistics = mail_session.close(timeout=1)
+            close_time = time.monotonic() - start_time
+        finally:
+            mail_session.connection_lock.release()
+
+        # Assert close returns within its timeout
+        self.assertLess(close_time, 2)
+        self.assertEqual(statistics['pending'], 0)
+
+    def test_mail_session_digest(self):
+        """Unit tests for delivery of digests of class MailSession."""
+
+        # Send digests through the queue of notifications, the first attempt fails
+        sent_digests = []
+
+        def send_mail(session_id, distribution_list, template, attachment, **kwargs):
+            sent_digests.append((session_id, distribution_list, template, attachment, kwargs))
+            if len(sent_digests) == 1:
+                raise Exception('Connection refused.')
+            return True
+
+        mail_session = utils.MailSession(is_digest=True, queue_size=10, retries=1)
+        mail_session.add_alert(['a@mobydq.io'], None, indicator_name='indicator_1')
+        mail_session.add_alert(['a@mobydq.io'], ('file.csv.gz', b''), indicator_name='indicator_2')
+        with mock.patch.object(utils, 'send_mail', send_mail):
+            statistics = mail_session.close(timeout=10)
+
+        # Assert digest is retried and sent once with all its alerts and attachments
+        expected_digest = (None, ['a@mobydq.io'], 'digest', [('file.csv.gz', b'')], {'alerts': [{'indicator_name': 'indicator_1'}, {'indicator_name': 'indicator_2'}]})
+        self.assertEqual(sent_digests, [expected_digest] * 2)
+        self.assertEqual(statistics, {'sent': 1, 'failed': 0, 'retries': 1, 'pending': 0})
+
 
 if __name__ == '__main__':
     unittest.main()
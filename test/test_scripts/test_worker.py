@@ -0,0 +1,49 @@
+"""Unit tests for module /scripts/init/worker.py."""
+import select
+import unittest
+from shared.utils import get_test_case_name
+from scripts.worker import BATCH_CHANNEL, Worker
+from scripts import utils
+
+
+class TestWorker(unittest.TestCase):
+    """Unit tests for class Worker."""
+
+    def test_execute_batch(self):
+        """Unit tests for methods connect, claim_batch and execute_batch."""
+
+        # Create test indicator group without indicator
+        test_case_name = get_test_case_name()
+        mutation_create_indicator_group = 'mutation{createIndicatorGroup(input:{indicatorGroup:{name:"test_case_name"}}){indicatorGroup{id}}}'
+        mutation_create_indicator_group = mutation_create_indicator_group.replace('test_case_name', str(test_case_name))  # Use replace() instead of format() because of curly braces
+        indicator_group = utils.execute_graphql_request(mutation_create_indicator_group)
+        indicator_group_id = indicator_group['data']['createIndicatorGroup']['indicatorGroup']['id']
+
+        # Listen to notifications and execute batch
+        worker = Worker()
+        worker.connect()
+        try:
+            mutation_execute_batch = 'mutation executeBatch($id:Int!){executeBatch(input:{indicatorGroupId:$id}){batch{id}}}'
+            batch = utils.execute_graphql_request(mutation_execute_batch, {'id': indicator_group_id})
+            batch_id = batch['data']['executeBatch']['batch']['id']
+
+            select.select([worker.connection], [], [], 10)
+            worker.connection.poll()
+            notifications = [(notify.channel, notify.payload) for notify in worker.connection.notifies]
+            is_executed = worker.execute_batch(batch_id)
+            is_executed_again = worker.execute_batch(batch_id)
+        finally:
+            worker.connection.close()
+
+        query_get_batch = 'query getBatch($id:Int!){batchById(id:$id){status}}'
+        batch = utils.execute_graphql_request(query_get_batch, {'id': batch_id})
+
+        # Assert batch is notified, claimed once and set to Failed since it has no session
+        self.assertIn((BATCH_CHANNEL, str(batch_id)), notifications)
+        self.assertTrue(is_executed)
+        self.assertFalse(is_executed_again)
+        self.assertEqual(batch['data']['batchById']['status'], 'Failed')
+
+
+if __name__ == '__main__':
+    unittest.main()